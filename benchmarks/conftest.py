@@ -0,0 +1,41 @@
+# Copyright (c) 2025, RTE (http://www.rte-france.com)
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+
+from pathlib import Path
+
+import pytest
+
+from grid2evaluate.synthetic_recording import generate_recording
+
+# synthetic recording size by tier
+TIERS = {
+    'small': {'n_sub': 14, 'n_gen': 5, 'n_load': 11, 'n_line': 20, 'n_storage': 2, 'n_steps': 100},
+    'medium': {'n_sub': 30, 'n_gen': 20, 'n_load': 40, 'n_line': 60, 'n_storage': 5, 'n_steps': 500},
+    'large': {'n_sub': 90, 'n_gen': 60, 'n_load': 120, 'n_line': 180, 'n_storage': 10, 'n_steps': 2000},
+}
+
+BASELINES_STORAGE = f"file://{Path(__file__).parent / 'baselines'}"
+
+
+def pytest_addoption(parser):
+    parser.addoption('--tiers', default='small,medium',
+                     help=f"comma separated size tiers of the benchmarks among {', '.join(TIERS)}")
+
+
+def pytest_configure(config):
+    # baselines are stored along the benchmarks unless another storage is given
+    if config.getoption('benchmark_storage', None) == 'file://./.benchmarks':
+        config.option.benchmark_storage = BASELINES_STORAGE
+
+
+def pytest_generate_tests(metafunc):
+    if 'tier' in metafunc.fixturenames:
+        metafunc.parametrize('tier', metafunc.config.getoption('tiers').split(','), scope='session')
+
+
+@pytest.fixture(scope='session')
+def recording_directory(tier: str, tmp_path_factory) -> Path:
+    return generate_recording(tmp_path_factory.mktemp(tier), done_at=TIERS[tier]['n_steps'] - 1, **TIERS[tier])
@@ -0,0 +1,49 @@
+# Copyright (c) 2025, RTE (http://www.rte-france.com)
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+
+import pytest
+
+from grid2evaluate.energy_util import calculate_curtailment_energy_by_generator, \
+    calculate_dispatched_energy_by_generator, calculate_balancing_energy_by_generator, \
+    calculate_lost_energy_by_generator, calculate_blackout_energy, calculate_energies_by_batch, ENERGY_NAMES
+from grid2evaluate.recording import Recording
+
+
+@pytest.fixture
+def recording(recording_directory) -> Recording:
+    recording = Recording(recording_directory)
+    for name in ['actions', 'gen', 'load', 'gen_p', 'gen_p_before_curtail', 'gen_actual_dispatch',
+                 'gen_target_dispatch', 'load_p']:
+        recording.table(name)
+    return recording
+
+
+def test_curtailment_energy(benchmark, recording):
+    benchmark(calculate_curtailment_energy_by_generator, recording.table('gen'),
+              recording.table('gen_p_before_curtail'), recording.table('gen_p'))
+
+
+def test_dispatched_energy(benchmark, recording):
+    benchmark(calculate_dispatched_energy_by_generator, recording.table('gen'), recording.table('gen_actual_dispatch'))
+
+
+def test_balancing_energy(benchmark, recording):
+    benchmark(calculate_balancing_energy_by_generator, recording.table('gen'),
+              recording.table('gen_actual_dispatch'), recording.table('gen_target_dispatch'))
+
+
+def test_lost_energy(benchmark, recording):
+    benchmark(calculate_lost_energy_by_generator, recording.table('gen'), recording.table('gen_p'),
+              recording.table('load'), recording.table('load_p'))
+
+
+def test_blackout_energy(benchmark, recording):
+    benchmark(calculate_blackout_energy, recording.table('actions'), recording.table('load'), recording.table('load_p'))
+
+
+@pytest.mark.parametrize('batch_size', [64, 1024])
+def test_energies_by_batch(benchmark, recording, batch_size):
+    benchmark(calculate_energies_by_batch, recording, ENERGY_NAMES, batch_size)
@@ -0,0 +1,22 @@
+# Copyright (c) 2025, RTE (http://www.rte-france.com)
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+
+import pytest
+
+from grid2evaluate.kpi_registry import create_kpi, get_kpi_names
+from grid2evaluate.recording import Recording
+
+# the security analysis of the network utilization is too long to be repeated
+ROUNDS = {'network_utilization': 1}
+
+
+@pytest.mark.parametrize('kpi_name', get_kpi_names())
+def test_kpi(benchmark, recording_directory, kpi_name):
+    kpi = create_kpi(kpi_name)
+    # a new recording for each round, so that reading the tables is part of the timing
+    values = benchmark.pedantic(lambda: kpi.evaluate(Recording(recording_directory)),
+                                rounds=ROUNDS.get(kpi_name, 5), warmup_rounds=0)
+    assert len(values) > 0
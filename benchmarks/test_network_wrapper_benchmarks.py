@@ -0,0 +1,60 @@
+# Copyright (c) 2025, RTE (http://www.rte-france.com)
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+
+from pathlib import Path
+
+import pytest
+
+from grid2evaluate.network_wrapper import NetworkWrapper, NetworkTimeSeries
+from grid2evaluate.recording import Recording
+
+
+def load_network_wrapper(recording: Recording) -> NetworkWrapper:
+    return NetworkWrapper.load(Path(recording.env_data.json['path']), recording.env_data.json['n_busbar_per_sub'])
+
+
+def create_time_series(network_wrapper: NetworkWrapper, recording: Recording) -> NetworkTimeSeries:
+    return network_wrapper.create_time_series(recording.table('load'), recording.table('load_p'),
+                                              recording.table('load_q'), recording.table('load_bus'),
+                                              recording.table('gen'), recording.table('gen_p'),
+                                              recording.table('gen_v'), recording.table('gen_bus'),
+                                              recording.table('storage'), recording.table('storage_power'),
+                                              recording.table('storage_bus'),
+                                              recording.table('line'), recording.table('line_or_bus'),
+                                              recording.table('line_ex_bus'))
+
+
+@pytest.fixture
+def recording(recording_directory) -> Recording:
+    return Recording(recording_directory)
+
+
+def test_load(benchmark, recording):
+    benchmark.pedantic(load_network_wrapper, args=(recording,), rounds=5)
+
+
+def test_create_time_series(benchmark, recording):
+    network_wrapper = load_network_wrapper(recording)
+    benchmark(create_time_series, network_wrapper, recording)
+
+
+def test_fingerprints(benchmark, recording):
+    time_series = create_time_series(load_network_wrapper(recording), recording)
+    benchmark(time_series.fingerprints, 1e-6)
+
+
+@pytest.mark.parametrize('delta_updates', [False, True])
+def test_update_network(benchmark, recording, delta_updates):
+    network_wrapper = load_network_wrapper(recording)
+    network_wrapper.delta_updates = delta_updates
+    time_series = create_time_series(network_wrapper, recording)
+    n_steps = recording.table('gen_p').num_rows
+
+    def update_all_steps():
+        for time_index in range(n_steps):
+            network_wrapper.update_network(time_series, time_index)
+
+    benchmark.pedantic(update_all_steps, rounds=3)
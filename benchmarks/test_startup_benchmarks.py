@@ -0,0 +1,36 @@
+# Copyright (c) 2025, RTE (http://www.rte-france.com)
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import grid2evaluate
+from grid2evaluate.kpi_registry import get_kpi_names
+
+# what a short-lived worker does: import the command line module, create the KPI and evaluate it once
+STARTUP_SCRIPT = """
+import sys
+from pathlib import Path
+import grid2evaluate.main
+from grid2evaluate.kpi_registry import create_kpi
+create_kpi(sys.argv[1]).evaluate(Path(sys.argv[2]))
+"""
+
+
+@pytest.mark.parametrize('kpi_name', get_kpi_names())
+def test_startup(benchmark, recording_directory, kpi_name):
+    # the package may not be installed, make it importable by the new interpreter
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([str(Path(grid2evaluate.__file__).parent.parent)]
+                                        + ([env['PYTHONPATH']] if 'PYTHONPATH' in env else []))
+    benchmark.pedantic(subprocess.run,
+                       args=([sys.executable, '-c', STARTUP_SCRIPT, kpi_name, str(recording_directory)],),
+                       kwargs={'env': env, 'check': True, 'capture_output': True},
+                       rounds=3)
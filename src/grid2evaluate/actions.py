@@ -6,12 +6,21 @@
 
 import json
 
+import numpy as np
 from pyarrow import Table
 
+# bus actions are only topological when they target lines
+BUS_ACTION_TYPES = ['set_bus', 'change_bus']
+LINE_TOPO_ACTION_TYPES = ['line_or_set_bus', 'line_ex_set_bus', 'line_or_change_bus', 'line_ex_change_bus',
+                          'line_set_status', 'line_change_status']
+REDISPATCH_ACTION_TYPES = ['redispatch', 'storage_p']
+CURTAIL_ACTION_TYPES = ['curtail']
+
 
 class Actions:
     def __init__(self, actions: list):
         self.actions = actions
+        self._type_masks = None
 
     def __len__(self):
         return len(self.actions)
@@ -21,10 +30,43 @@ class Actions:
 
     @staticmethod
     def load(action_table: Table) -> 'Actions':
-        actions = []
-        for row in action_table.to_pandas().itertuples():
-            actions.append(json.loads(row.action))
-        return Actions(actions)
+        return Actions([json.loads(action) for action in action_table['action'].to_pylist()])
+
+    @property
+    def type_masks(self) -> dict[str, np.ndarray]:
+        """
+        Presence mask of each action type for each step, computed once. Bus action types only flag steps where
+        they target lines.
+        """
+        if self._type_masks is None:
+            type_masks = {action_type: np.zeros(len(self.actions), dtype=bool)
+                          for action_type in BUS_ACTION_TYPES + LINE_TOPO_ACTION_TYPES
+                          + REDISPATCH_ACTION_TYPES + CURTAIL_ACTION_TYPES}
+            for time_index, actions in enumerate(self.actions):
+                for action_type in actions.keys() & type_masks.keys():
+                    if action_type not in BUS_ACTION_TYPES \
+                            or 'lines_or_id' in actions[action_type] or 'lines_ex_id' in actions[action_type]:
+                        type_masks[action_type][time_index] = True
+            self._type_masks = type_masks
+        return self._type_masks
+
+    def _count_actions(self, action_types: list[str]) -> np.ndarray:
+        counts = np.zeros(len(self.actions), dtype=np.int64)
+        for action_type in action_types:
+            counts += self.type_masks[action_type]
+        return counts
+
+    def count_topo_actions(self) -> np.ndarray:
+        """
+        Number of topological action types of each step, same as the length of each step of filter_topo_actions.
+        """
+        return self._count_actions(BUS_ACTION_TYPES + LINE_TOPO_ACTION_TYPES)
+
+    def count_redispatch_actions(self) -> np.ndarray:
+        return self._count_actions(REDISPATCH_ACTION_TYPES)
+
+    def count_curtail_actions(self) -> np.ndarray:
+        return self._count_actions(CURTAIL_ACTION_TYPES)
 
     @staticmethod
     def _filter_step_actions(actions: dict, action_types: list[str]) -> dict:
@@ -37,25 +79,20 @@ class Actions:
     @staticmethod
     def _filter_step_topo_actions(actions: dict) -> dict:
         only_topo_actions = {}
-        for action_type in ['set_bus', 'change_bus']:
+        for action_type in BUS_ACTION_TYPES:
             if action_type in actions:
                 if 'lines_or_id' in actions[action_type] or 'lines_ex_id' in actions[action_type]:
                     only_topo_actions[action_type] = actions[action_type]
-        only_topo_actions.update(Actions._filter_step_actions(actions,['line_or_set_bus',
-                                                                                  'line_ex_set_bus',
-                                                                                  'line_or_change_bus',
-                                                                                  'line_ex_change_bus',
-                                                                                  'line_set_status',
-                                                                                  'line_change_status']))
+        only_topo_actions.update(Actions._filter_step_actions(actions, LINE_TOPO_ACTION_TYPES))
         return only_topo_actions
 
     @staticmethod
     def _filter_step_redispatch_actions(actions: dict) -> dict:
-        return Actions._filter_step_actions(actions, ['redispatch', 'storage_p'])
+        return Actions._filter_step_actions(actions, REDISPATCH_ACTION_TYPES)
 
     @staticmethod
     def _filter_step_curtail_actions(actions: dict) -> dict:
-        return Actions._filter_step_actions(actions, ['curtail'])
+        return Actions._filter_step_actions(actions, CURTAIL_ACTION_TYPES)
 
     def filter_topo_actions(self) -> 'Actions':
         return Actions([self._filter_step_topo_actions(action) for action in self.actions])
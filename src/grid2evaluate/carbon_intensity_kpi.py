@@ -4,35 +4,48 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 # SPDX-License-Identifier: MPL-2.0
 
-from pathlib import Path
+from typing import Optional
 
-import pyarrow.parquet as pq
-
-from grid2evaluate.energy_util import calculate_dispatched_energy_by_generator, \
-    calculate_curtailment_energy_by_generator
+from grid2evaluate.energy_util import calculate_energies_by_batch
 from grid2evaluate.grid_kpi import GridKpi
+from grid2evaluate.intermediates import get_intermediate
+from grid2evaluate.recording import Recording
 
 
 class CarbonIntensityKpi(GridKpi):
-    def __init__(self):
-        super().__init__("Carbon Intensity")
+    input_files = ['gen.parquet', 'gen_p_before_curtail.parquet', 'gen_p.parquet', 'gen_actual_dispatch.parquet']
 
-    def evaluate(self, directory: Path) -> list[float]:
-        # step 1
-        gen_table = pq.read_table(directory / 'gen.parquet')
+    intermediates = ['table:gen', 'curtailment_energy', 'dispatched_energy']
 
-        # step 2
-        gen_p_before_curtail_table = pq.read_table(directory / 'gen_p_before_curtail.parquet')
+    value_names = ['carbon_intensity']
 
-        # step 3
-        gen_p_table = pq.read_table(directory / 'gen_p.parquet')
+    def __init__(self, batch_size: Optional[int] = None):
+        """
+        With a batch size, time series tables are streamed by batches of this number of rows instead of being
+        fully loaded, to bound memory on long recordings.
+        """
+        super().__init__("Carbon Intensity")
+        self.batch_size = batch_size
+
+    def get_intermediates(self) -> list[str]:
+        # batches are streamed by the KPI itself
+        return self.intermediates if self.batch_size is None else ['table:gen']
+
+    def _evaluate(self, recording: Recording) -> list[float]:
+        # step 1
+        gen_table = recording.table('gen')
 
-        # step 4
-        e_curtailment = calculate_curtailment_energy_by_generator(gen_table, gen_p_before_curtail_table, gen_p_table)
+        if self.batch_size is not None:
+            # step 2 to 5
+            energies = calculate_energies_by_batch(recording, ['curtailment', 'dispatched'], self.batch_size)
+            e_curtailment = energies['curtailment']
+            e_redispatch = energies['dispatched']
+        else:
+            # step 2 to 4
+            e_curtailment = get_intermediate(recording, 'curtailment_energy')
 
-        # step 5
-        gen_actual_dispatch_table = pq.read_table(directory / 'gen_actual_dispatch.parquet')
-        e_redispatch = calculate_dispatched_energy_by_generator(gen_table, gen_actual_dispatch_table)
+            # step 5
+            e_redispatch = get_intermediate(recording, 'dispatched_energy')
 
         # step 6:
         energy = e_curtailment + e_redispatch
@@ -0,0 +1,77 @@
+# Copyright (c) 2025, RTE (http://www.rte-france.com)
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+
+import hashlib
+import json
+import logging
+import os
+from typing import Optional, TYPE_CHECKING
+
+import numpy as np
+from pyarrow import ChunkedArray
+
+from grid2evaluate.recording import Recording
+from grid2evaluate.result_cache import hash_file
+
+if TYPE_CHECKING:
+    from grid2evaluate.grid_kpi import GridKpi
+
+logger = logging.getLogger(__name__)
+
+
+class KpiCheckpoint:
+    """
+    Resumable partial state of a KPI evaluated on a recording that is still growing, saved in a sidecar file
+    of the recording directory (.checkpoints/<KPI class>-<key>.npz). The state is a dict of numpy arrays
+    covering the first num_rows steps of the recording. The key depends on the KPI version and parameters and
+    on the element tables of the recording, and the state is discarded when the steps it covers have been
+    rewritten.
+    """
+    DIRECTORY_NAME = '.checkpoints'
+
+    # files of the recording that must not change for a state to be resumed
+    STATIC_FILES = ['gen.parquet', 'load.parquet', 'storage.parquet', 'line.parquet', 'env.json']
+
+    def __init__(self, kpi: 'GridKpi', recording: Recording):
+        self.kpi_name = kpi.name
+        key = {
+            'kpi': f"{type(kpi).__module__}.{type(kpi).__qualname__}",
+            'version': kpi.version,
+            'parameters': kpi.get_parameters(),
+            'inputs': {static_file: hash_file(recording.directory / static_file)
+                       for static_file in self.STATIC_FILES if (recording.directory / static_file).exists()},
+        }
+        key_hash = hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+        self.path = recording.directory / self.DIRECTORY_NAME / f"{type(kpi).__name__}-{key_hash[:16]}.npz"
+        # time of the last step covered by the loaded state
+        self.last_time = None
+
+    def load(self, time_col: ChunkedArray) -> tuple[int, Optional[dict[str, np.ndarray]]]:
+        """
+        Load the state if it is valid for the recording of the given time column. Returns the number of steps
+        covered by the state and the state, or 0 and None if there is no valid state. The time of the last
+        covered step is kept in last_time.
+        """
+        if not self.path.exists():
+            return 0, None
+        with np.load(self.path) as data:
+            state = {name: data[name] for name in data.files}
+        num_rows = int(state.pop('num_rows'))
+        last_time = state.pop('last_time').item()
+        if num_rows > len(time_col) or (num_rows > 0 and time_col[num_rows - 1].as_py() != last_time):
+            logger.warning(f"Checkpoint of '{self.kpi_name}' discarded as the recorded steps have been rewritten")
+            return 0, None
+        logger.info(f"Resuming '{self.kpi_name}' from step {num_rows}")
+        self.last_time = last_time if num_rows > 0 else None
+        return num_rows, state
+
+    def save(self, num_rows: int, last_time, state: dict[str, np.ndarray]):
+        self.path.parent.mkdir(exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, num_rows=np.array(num_rows),
+                     last_time=np.array(last_time if last_time is not None else 0), **state)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,78 @@
+# Copyright (c) 2025, RTE (http://www.rte-france.com)
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+
+import math
+from typing import Optional
+
+import numpy as np
+import pypowsybl as pp
+
+MATRIX_ID = 'screening'
+
+
+class DcScreening:
+    """
+    Estimation of the post-contingency currents of the monitored branches with a DC sensitivity analysis,
+    to only run the AC security analysis on the contingencies that may load a monitored branch close to its
+    thermal limit. Contingencies whose estimated max rho is below threshold (for instance 0.8 for a 20% margin)
+    are screened out. Contingencies without estimate (splitting the network for instance) are never
+    screened out.
+    thermal_limits is the (time, monitored branch) array of the thermal limits, infinite for branches without
+    thermal limit.
+    """
+    def __init__(self, network: pp.network.Network, contingency_ids: list[str], monitored_element_ids: list[str],
+                 thermal_limits: np.ndarray, threshold: float):
+        self.contingency_ids = contingency_ids
+        self.monitored_element_ids = monitored_element_ids
+        self.thermal_limits = thermal_limits
+        self.threshold = threshold
+        # DC flows are active powers in MW, converted to currents in A at the nominal voltage of each side
+        branches = network.get_branches(attributes=['voltage_level1_id', 'voltage_level2_id']).loc[monitored_element_ids]
+        nominal_v = network.get_voltage_levels(attributes=['nominal_v'])['nominal_v']
+        self._current_factors = np.stack([1000 / (math.sqrt(3) * branches['voltage_level1_id'].map(nominal_v).to_numpy()),
+                                          1000 / (math.sqrt(3) * branches['voltage_level2_id'].map(nominal_v).to_numpy())],
+                                         axis=-1)
+        # any injection is a valid variable, only reference flows are used
+        generator_ids = network.get_generators(attributes=[]).index
+        self._variable_id = generator_ids[0] if len(generator_ids) > 0 else network.get_loads(attributes=[]).index[0]
+        self._analysis: Optional[pp.sensitivity.DcSensitivityAnalysis] = None
+
+    def __getstate__(self):
+        # the analysis is a native object, created again on first use in worker processes
+        state = self.__dict__.copy()
+        state['_analysis'] = None
+        return state
+
+    def _get_analysis(self) -> pp.sensitivity.DcSensitivityAnalysis:
+        if self._analysis is None:
+            self._analysis = pp.sensitivity.create_dc_analysis()
+            self._analysis.add_single_element_contingencies(self.contingency_ids)
+            self._analysis.add_branch_flow_factor_matrix(branches_ids=self.monitored_element_ids,
+                                                         variables_ids=[self._variable_id], matrix_id=MATRIX_ID)
+        return self._analysis
+
+    def estimate_flows(self, network: pp.network.Network) -> np.ndarray:
+        """
+        Estimated (contingency, monitored branch, side) currents of the current network state, NaN where the
+        DC analysis has no estimate.
+        """
+        result = self._get_analysis().run(network)
+        reference_flows = np.stack([result.get_reference_matrix(MATRIX_ID, contingency_id).to_numpy()[0]
+                                    for contingency_id in self.contingency_ids])
+        return np.abs(reference_flows)[:, :, np.newaxis] * self._current_factors[np.newaxis, :, :]
+
+    def screen(self, network: pp.network.Network, time_index: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Estimate the flows of a step and return them with the mask of the contingencies to run in AC.
+        """
+        flows = self.estimate_flows(network)
+        rho = np.max(flows, axis=-1) / self.thermal_limits[time_index][np.newaxis, :]
+        # branches without estimate, as the tripped branch itself, do not select a contingency but a
+        # contingency without any estimate is selected
+        estimated = ~np.isnan(rho)
+        selected = np.max(np.where(estimated, rho, -np.inf), axis=1) >= self.threshold
+        selected |= ~estimated.any(axis=1)
+        return np.nan_to_num(flows, nan=0.0), selected
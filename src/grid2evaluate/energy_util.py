@@ -4,73 +4,245 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 # SPDX-License-Identifier: MPL-2.0
 
-from pyarrow import Table, ChunkedArray
+from typing import Union
+
+import numpy as np
+from pyarrow import Table, ChunkedArray, RecordBatch
+
+from grid2evaluate.recording import Recording
+
+ENERGY_NAMES = ['curtailment', 'dispatched', 'balancing', 'lost', 'blackout']
 
 
 def calculate_duration_step(time_col: ChunkedArray, time_index: int):
     return (time_col[time_index].as_py() - time_col[time_index - 1].as_py()) / 3600 if time_index > 0 else 0
 
 
+def calculate_duration_steps(time_col: ChunkedArray) -> np.ndarray:
+    """
+    Duration in hours of every step of the time column, computed once for the whole episode.
+    The first step has a null duration, as in calculate_duration_step.
+    """
+    times = np.asarray(time_col)
+    duration_steps = np.zeros(len(times), dtype=np.float64)
+    if len(times) > 1:
+        duration_steps[1:] = np.diff(times) / 3600
+    return duration_steps
+
+
+def to_matrix(table: Table, names: ChunkedArray, dtype=np.float64) -> np.ndarray:
+    """
+    Convert the columns of a time series table to a (time, element) matrix, float64 by default, columns
+    being ordered like the element names.
+    """
+    matrix = np.empty((table.num_rows, len(names)), dtype=dtype)
+    for index, name in enumerate(names.to_pylist()):
+        matrix[:, index] = np.asarray(table[str(name)])
+    return matrix
+
+
+def integrate_by_column(matrix: np.ndarray, duration_steps: np.ndarray) -> np.ndarray:
+    """
+    Energy of each column of a (time, element) power matrix, i.e. the product of the transposed matrix with
+    the duration step vector. Terms are accumulated in time order so that results are identical to a step by
+    step summation.
+    """
+    if matrix.shape[0] == 0:
+        return np.zeros(matrix.shape[1], dtype=np.float64)
+    terms = matrix * duration_steps[:, np.newaxis]
+    return np.cumsum(terms, axis=0, out=terms)[-1]
+
+
+def _sum_in_order(terms: np.ndarray) -> float:
+    return float(np.cumsum(terms)[-1]) if len(terms) > 0 else 0.0
+
+
 def calculate_curtailment_energy_by_generator(gen_table: Table, gen_p_before_curtail_table: Table, gen_p_table: Table) -> list[float]:
-    e_curtailment = [0] * len(gen_table)
-    time_col = gen_p_before_curtail_table['time']
-    for (gen_index, gen_name) in enumerate(gen_table['name']):
-        gen_p_before_curtail_col = gen_p_before_curtail_table[str(gen_name)]
-        gen_p_col = gen_p_table[str(gen_name)]
-        for time_index, (gen_p_before_curtail, gen_p) in enumerate(zip(gen_p_before_curtail_col, gen_p_col)):
-            duration_step = calculate_duration_step(time_col, time_index)
-            e_curtailment[gen_index] += (gen_p.as_py() - gen_p_before_curtail.as_py()) * duration_step
-    return e_curtailment
+    duration_steps = calculate_duration_steps(gen_p_before_curtail_table['time'])
+    gen_p_before_curtail = to_matrix(gen_p_before_curtail_table, gen_table['name'])
+    gen_p = to_matrix(gen_p_table, gen_table['name'])
+    return integrate_by_column(gen_p - gen_p_before_curtail, duration_steps).tolist()
 
 
 def calculate_dispatched_energy_by_generator(gen_table: Table, gen_actual_dispatch_table: Table) -> list[float]:
-    e_redispatch = [0] * len(gen_table)
-    time_col = gen_actual_dispatch_table['time']
-    for (gen_index, gen_name) in enumerate(gen_table['name']):
-        gen_actual_dispatch_col = gen_actual_dispatch_table[str(gen_name)]
-        for time_index, gen_actual_dispatch in enumerate(gen_actual_dispatch_col):
-            duration_step = calculate_duration_step(time_col, time_index)
-            e_redispatch[gen_index] += gen_actual_dispatch.as_py() * duration_step
-    return e_redispatch
+    duration_steps = calculate_duration_steps(gen_actual_dispatch_table['time'])
+    gen_actual_dispatch = to_matrix(gen_actual_dispatch_table, gen_table['name'])
+    return integrate_by_column(gen_actual_dispatch, duration_steps).tolist()
 
 
 def calculate_balancing_energy_by_generator(gen_table: Table, gen_actual_dispatch_table: Table, gen_target_dispatch_table: Table) -> list[float]:
-    e_balancing = [0] * len(gen_table)
-    time_col = gen_target_dispatch_table['time']
-    for (gen_index, gen_name) in enumerate(gen_table['name']):
-        gen_actual_dispatch_col = gen_actual_dispatch_table[str(gen_name)]
-        gen_target_dispatch_col = gen_target_dispatch_table[str(gen_name)]
-        for time_index, (gen_actual_dispatch, gen_target_dispatch) in enumerate(zip(gen_actual_dispatch_col,
-                                                                                    gen_target_dispatch_col)):
-            duration_step = calculate_duration_step(time_col, time_index)
-            e_balancing[gen_index] += (gen_actual_dispatch.as_py() - gen_target_dispatch.as_py()) * duration_step
-    return e_balancing
+    duration_steps = calculate_duration_steps(gen_target_dispatch_table['time'])
+    gen_actual_dispatch = to_matrix(gen_actual_dispatch_table, gen_table['name'])
+    gen_target_dispatch = to_matrix(gen_target_dispatch_table, gen_table['name'])
+    return integrate_by_column(gen_actual_dispatch - gen_target_dispatch, duration_steps).tolist()
 
 
 def calculate_lost_energy_by_generator(gen_table: Table, gen_p_table: Table, load_table: Table, load_p_table: Table) -> float:
-    e_lost = 0.0
-    time_col = gen_p_table['time']
-    for gen_name in gen_table['name']:
-        gen_p_col = gen_p_table[str(gen_name)]
-        for time_index, gen_p in enumerate(gen_p_col):
-            duration_step = calculate_duration_step(time_col, time_index)
-            e_lost += gen_p.as_py() * duration_step
-    for load_name in load_table['name']:
-        load_p_col = load_p_table[str(load_name)]
-        for time_index, load_p in enumerate(load_p_col):
-            duration_step = calculate_duration_step(time_col, time_index)
-            e_lost -= load_p.as_py() * duration_step
-    return e_lost
+    duration_steps = calculate_duration_steps(gen_p_table['time'])
+    gen_p = to_matrix(gen_p_table, gen_table['name'])
+    load_p = to_matrix(load_p_table, load_table['name'])
+    # generators first then loads, each element over the whole episode, as in the step by step summation
+    terms = np.concatenate([(gen_p * duration_steps[:, np.newaxis]).ravel(order='F'),
+                            -(load_p * duration_steps[:, np.newaxis]).ravel(order='F')])
+    return _sum_in_order(terms)
 
 
 def calculate_blackout_energy(action_table: Table, load_table: Table, load_p_table: Table) -> float:
     e_blackout = 0.0
-    done_col = action_table['done'].to_pandas()
-    if done_col.any():
-        blackout_time_index = done_col.idxmax()
-        time_col = load_p_table['time']
-        duration_step = calculate_duration_step(time_col, blackout_time_index)
-        for (load_index, load_name) in enumerate(load_table['name']):
-            load_p = load_p_table[str(load_name)]
-            e_blackout += load_p[blackout_time_index - 1].as_py() * duration_step
+    done_col = action_table['done'].to_numpy()
+    blackout_time_index = int(np.argmax(done_col)) if done_col.any() else 0
+    # the first step has a null duration, so a blackout on it does not lose any energy
+    if blackout_time_index > 0:
+        duration_step = calculate_duration_steps(load_p_table['time'])[blackout_time_index]
+        load_p = to_matrix(load_p_table.slice(blackout_time_index - 1, 1), load_table['name'])
+        e_blackout = _sum_in_order(load_p[0] * duration_step)
     return e_blackout
+
+
+class EnergyAccumulator:
+    """
+    Energy of each column of power batches given one after the other, the timestamp of the last step of a
+    batch being carried over to compute the duration of the first step of the next one. Results are identical
+    to integrate_by_column on the whole episode.
+    """
+    def __init__(self, n_elements: int):
+        self.energy = np.zeros(n_elements, dtype=np.float64)
+        self.last_time = None
+
+    def add(self, time_col, power: np.ndarray):
+        times = np.asarray(time_col)
+        if len(times) == 0:
+            return
+        duration_steps = np.diff(times, prepend=times[0] if self.last_time is None else self.last_time) / 3600
+        terms = power * duration_steps[:, np.newaxis]
+        terms[0] += self.energy
+        self.energy = np.cumsum(terms, axis=0, out=terms)[-1]
+        self.last_time = times[-1]
+
+
+class EnergyCalculator:
+    """
+    Energies of an episode computed from batches of its time series tables given in time order. energy_names
+    are among ENERGY_NAMES: curtailment, dispatched and balancing energies are given by generator, lost and
+    blackout energies are totals. Results do not depend on the batches, and are identical to the
+    calculate_*_energy functions except for the lost energy total, which is the sum of the energies of each
+    element and so only equal up to floating point summation order. The state of the calculation can be saved and restored to resume it on new steps.
+    """
+    def __init__(self, energy_names: list[str], gen_names: ChunkedArray, load_names: ChunkedArray):
+        self.energy_names = energy_names
+        self.gen_names = gen_names
+        self.load_names = load_names
+        self._accumulators = {energy_name: EnergyAccumulator(len(gen_names))
+                              for energy_name in ['curtailment', 'dispatched', 'balancing', 'lost']}
+        self._load_accumulator = EnergyAccumulator(len(load_names))
+        self._blackout_time_index = None
+        self._e_blackout = 0.0
+        self._last_load_p = None
+        self.time_index = 0
+        self.last_time = None
+
+    def get_columns(self) -> dict[str, list[str]]:
+        """
+        Columns to read by table name.
+        """
+        gen_columns = ['time'] + [str(name) for name in self.gen_names.to_pylist()]
+        load_columns = ['time'] + [str(name) for name in self.load_names.to_pylist()]
+        columns = {}
+        if 'curtailment' in self.energy_names:
+            columns.update({'gen_p_before_curtail': gen_columns, 'gen_p': gen_columns})
+        if 'dispatched' in self.energy_names or 'balancing' in self.energy_names:
+            columns['gen_actual_dispatch'] = gen_columns
+        if 'balancing' in self.energy_names:
+            columns['gen_target_dispatch'] = gen_columns
+        if 'lost' in self.energy_names:
+            columns.update({'gen_p': gen_columns, 'load_p': load_columns})
+        if 'blackout' in self.energy_names:
+            columns.update({'actions': ['done'], 'load_p': load_columns})
+        return columns
+
+    def add(self, batches: dict[str, Union[RecordBatch, Table]]):
+        """
+        Add the next rows of the tables, given by table name as returned by Recording.iter_batches.
+        """
+        gen_names = self.gen_names
+        load_names = self.load_names
+        gen_p = to_matrix(batches['gen_p'], gen_names) if 'gen_p' in batches else None
+        if 'curtailment' in self.energy_names:
+            self._accumulators['curtailment'].add(batches['gen_p_before_curtail']['time'],
+                                                  gen_p - to_matrix(batches['gen_p_before_curtail'], gen_names))
+        if 'dispatched' in self.energy_names:
+            self._accumulators['dispatched'].add(batches['gen_actual_dispatch']['time'],
+                                                 to_matrix(batches['gen_actual_dispatch'], gen_names))
+        if 'balancing' in self.energy_names:
+            self._accumulators['balancing'].add(batches['gen_target_dispatch']['time'],
+                                                to_matrix(batches['gen_actual_dispatch'], gen_names)
+                                                - to_matrix(batches['gen_target_dispatch'], gen_names))
+        load_p = to_matrix(batches['load_p'], load_names) if 'load_p' in batches else None
+        if 'lost' in self.energy_names:
+            self._accumulators['lost'].add(batches['gen_p']['time'], gen_p)
+            self._load_accumulator.add(batches['gen_p']['time'], load_p)
+        times = np.asarray(next(batch for batch in batches.values() if 'time' in batch.column_names)['time'])
+        if 'blackout' in self.energy_names:
+            done = np.asarray(batches['actions']['done'])
+            if self._blackout_time_index is None and done.any():
+                batch_index = int(np.argmax(done))
+                self._blackout_time_index = self.time_index + batch_index
+                # the first step has a null duration, so a blackout on it does not lose any energy
+                if self._blackout_time_index > 0:
+                    previous_time = times[batch_index - 1] if batch_index > 0 else self.last_time
+                    previous_load_p = load_p[batch_index - 1] if batch_index > 0 else self._last_load_p
+                    self._e_blackout = _sum_in_order(previous_load_p * ((times[batch_index] - previous_time) / 3600))
+            if len(times) > 0:
+                self._last_load_p = load_p[-1]
+        if len(times) > 0:
+            self.last_time = times[-1]
+        self.time_index += len(times)
+
+    def get_energies(self) -> dict[str, Union[list[float], float]]:
+        energies = {}
+        for energy_name in ['curtailment', 'dispatched', 'balancing']:
+            if energy_name in self.energy_names:
+                energies[energy_name] = self._accumulators[energy_name].energy.tolist()
+        if 'lost' in self.energy_names:
+            energies['lost'] = _sum_in_order(np.concatenate([self._accumulators['lost'].energy,
+                                                             -self._load_accumulator.energy]))
+        if 'blackout' in self.energy_names:
+            energies['blackout'] = self._e_blackout
+        return energies
+
+    def get_state(self) -> dict[str, np.ndarray]:
+        state = {f'{energy_name}_energy': accumulator.energy for energy_name, accumulator in self._accumulators.items()}
+        state['load_energy'] = self._load_accumulator.energy
+        state['blackout_time_index'] = np.array(-1 if self._blackout_time_index is None else self._blackout_time_index)
+        state['blackout_energy'] = np.array(self._e_blackout)
+        if self._last_load_p is not None:
+            state['last_load_p'] = self._last_load_p
+        return state
+
+    def set_state(self, state: dict[str, np.ndarray], time_index: int, last_time):
+        """
+        Restore a state got from get_state after time_index steps, the last one being at last_time.
+        """
+        for energy_name, accumulator in self._accumulators.items():
+            accumulator.energy = state[f'{energy_name}_energy'].copy()
+            accumulator.last_time = last_time
+        self._load_accumulator.energy = state['load_energy'].copy()
+        self._load_accumulator.last_time = last_time
+        blackout_time_index = int(state['blackout_time_index'])
+        self._blackout_time_index = None if blackout_time_index == -1 else blackout_time_index
+        self._e_blackout = float(state['blackout_energy'])
+        self._last_load_p = state.get('last_load_p')
+        self.time_index = time_index
+        self.last_time = last_time
+
+
+def calculate_energies_by_batch(recording: Recording, energy_names: list[str],
+                                batch_size: int) -> dict[str, Union[list[float], float]]:
+    """
+    Streaming counterpart of the calculate_*_energy functions, reading the time series tables batch by batch
+    so that memory is bounded by the batch size and not by the episode length.
+    """
+    calculator = EnergyCalculator(energy_names, recording.table('gen')['name'], recording.table('load')['name'])
+    for batches in recording.iter_batches(calculator.get_columns(), batch_size):
+        calculator.add(batches)
+    return calculator.get_energies()
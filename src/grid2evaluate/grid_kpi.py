@@ -6,12 +6,78 @@
 
 from abc import ABC, abstractmethod
 from pathlib import Path
+from typing import Optional, Union
+
+from grid2evaluate import profiling
+from grid2evaluate.recording import Recording
+from grid2evaluate.result_cache import KpiResultCache
 
 
 class GridKpi(ABC):
+    # to be increased when a change of the implementation changes the KPI values, to invalidate cached results
+    version = "1"
+
+    # files of the recording read by the KPI evaluation
+    input_files: list[str] = []
+
+    # intermediates of the recording used by the KPI evaluation (see intermediates.INTERMEDIATES), computed once
+    # for all the KPIs of a recording
+    intermediates: list[str] = []
+
+    # names of the values of the KPI, in order
+    value_names: list[str] = []
+
     def __init__(self, name):
         self.name = name
 
+    def get_parameters(self) -> dict:
+        """
+        Parameters of the KPI having an effect on its values.
+        """
+        return {key: value for key, value in vars(self).items() if key != 'name'}
+
+    def get_intermediates(self) -> list[str]:
+        return self.intermediates
+
+    def get_value_names(self) -> list[str]:
+        """
+        Names of the values returned by the evaluation, in order, which may depend on the parameters.
+        """
+        return self.value_names
+
+    def get_input_files(self, recording: Recording) -> list[Path]:
+        return [recording.directory / input_file for input_file in self.input_files]
+
+    def evaluate(self, recording: Union[Path, Recording], cache: Optional[KpiResultCache] = None) -> list[float]:
+        """
+        Evaluate the KPI on a recording directory. A Recording can be given instead of a path to share the
+        loaded tables between several KPIs. If a result cache is given, values are taken from it when the
+        input files of the KPI have not changed since they were cached.
+        """
+        recording = Recording.of(recording)
+        with profiling.evaluating(self.name):
+            values = self.get_cached(recording, cache)
+            if values is not None:
+                return values
+            return self.evaluate_uncached(recording, cache)
+
+    def get_cached(self, recording: Recording, cache: Optional[KpiResultCache]) -> Optional[list[float]]:
+        """
+        Cached values of the KPI on a recording, None if there is no cache or they are not in it.
+        """
+        if cache is None:
+            return None
+        return cache.get(self, recording)
+
+    def evaluate_uncached(self, recording: Recording, cache: Optional[KpiResultCache] = None) -> list[float]:
+        """
+        Evaluate the KPI on a recording without looking up the cache, and put the values in it if given.
+        """
+        values = self._evaluate(recording)
+        if cache is not None:
+            cache.put(self, recording, values)
+        return values
+
     @abstractmethod
-    def evaluate(self, directory: Path) -> list[float]:
+    def _evaluate(self, recording: Recording) -> list[float]:
         pass
@@ -0,0 +1,114 @@
+# Copyright (c) 2025, RTE (http://www.rte-france.com)
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+
+from typing import Any, Callable
+
+import numpy as np
+
+from grid2evaluate import profiling
+from grid2evaluate.actions import Actions
+from grid2evaluate.energy_util import calculate_curtailment_energy_by_generator, \
+    calculate_dispatched_energy_by_generator, calculate_balancing_energy_by_generator, \
+    calculate_lost_energy_by_generator, calculate_blackout_energy, to_matrix
+from grid2evaluate.recording import Recording, TABLE_PREFIX
+
+# prefix of the memoization keys of intermediates, other than tables
+INTERMEDIATE_PREFIX = 'intermediate:'
+
+
+class Intermediate:
+    """
+    Value computed from a recording and shared by the KPIs evaluated on it, from other intermediates, its
+    dependencies. Tables are intermediates named 'table:<table name>'.
+    """
+    def __init__(self, dependencies: list[str], function: Callable[[Recording], Any]):
+        self.dependencies = dependencies
+        self.function = function
+
+
+def calculate_connected_buses(recording: Recording) -> list[int]:
+    # we can get it for unique pairs of (substation_num, local_bus_num) for both ends of lines
+    line_table = recording.table('line')
+    line_or_bus = to_matrix(recording.table('line_or_bus'), line_table['name'], dtype=np.int64)
+    line_ex_bus = to_matrix(recording.table('line_ex_bus'), line_table['name'], dtype=np.int64)
+    bus_nums = np.concatenate([line_or_bus, line_ex_bus], axis=1)
+    sub_ids = np.concatenate([line_table['line_or_to_subid'].to_numpy(),
+                              line_table['line_ex_to_subid'].to_numpy()]).astype(np.int64)
+    # encode each pair as a single integer, -1 for disconnected line ends
+    n_bus_codes = max(int(bus_nums.max(initial=0)), 0) + 1
+    codes = np.where(bus_nums != -1, sub_ids[np.newaxis, :] * n_bus_codes + bus_nums, -1)
+    # count distinct codes of each step
+    codes.sort(axis=1)
+    distinct = np.ones(codes.shape, dtype=bool)
+    distinct[:, 1:] = codes[:, 1:] != codes[:, :-1]
+    return np.count_nonzero(distinct & (codes != -1), axis=1).tolist()
+
+
+def _action_counter(count: Callable[[Actions], np.ndarray]) -> Callable[[Recording], np.ndarray]:
+    def count_actions(recording: Recording) -> np.ndarray:
+        # action type masks are computed once, before counting actions from them
+        get_intermediate(recording, 'action_type_masks')
+        return count(recording.actions)
+    return count_actions
+
+
+INTERMEDIATES = {
+    'actions': Intermediate([f'{TABLE_PREFIX}actions'], lambda recording: recording.actions),
+    'action_type_masks': Intermediate(['actions'],
+                                      lambda recording: get_intermediate(recording, 'actions').type_masks),
+    'topo_action_counts': Intermediate(['action_type_masks'], _action_counter(Actions.count_topo_actions)),
+    'redispatch_action_counts': Intermediate(['action_type_masks'], _action_counter(Actions.count_redispatch_actions)),
+    'curtail_action_counts': Intermediate(['action_type_masks'], _action_counter(Actions.count_curtail_actions)),
+    'curtailment_energy': Intermediate(
+        [f'{TABLE_PREFIX}gen', f'{TABLE_PREFIX}gen_p_before_curtail', f'{TABLE_PREFIX}gen_p'],
+        lambda recording: calculate_curtailment_energy_by_generator(recording.table('gen'),
+                                                                    recording.table('gen_p_before_curtail'),
+                                                                    recording.table('gen_p'))),
+    'dispatched_energy': Intermediate(
+        [f'{TABLE_PREFIX}gen', f'{TABLE_PREFIX}gen_actual_dispatch'],
+        lambda recording: calculate_dispatched_energy_by_generator(recording.table('gen'),
+                                                                   recording.table('gen_actual_dispatch'))),
+    'balancing_energy': Intermediate(
+        [f'{TABLE_PREFIX}gen', f'{TABLE_PREFIX}gen_actual_dispatch', f'{TABLE_PREFIX}gen_target_dispatch'],
+        lambda recording: calculate_balancing_energy_by_generator(recording.table('gen'),
+                                                                  recording.table('gen_actual_dispatch'),
+                                                                  recording.table('gen_target_dispatch'))),
+    'lost_energy': Intermediate(
+        [f'{TABLE_PREFIX}gen', f'{TABLE_PREFIX}gen_p', f'{TABLE_PREFIX}load', f'{TABLE_PREFIX}load_p'],
+        lambda recording: calculate_lost_energy_by_generator(recording.table('gen'), recording.table('gen_p'),
+                                                             recording.table('load'), recording.table('load_p'))),
+    'blackout_energy': Intermediate(
+        [f'{TABLE_PREFIX}actions', f'{TABLE_PREFIX}load', f'{TABLE_PREFIX}load_p'],
+        lambda recording: calculate_blackout_energy(recording.table('actions'), recording.table('load'),
+                                                    recording.table('load_p'))),
+    'connected_buses': Intermediate(
+        [f'{TABLE_PREFIX}line', f'{TABLE_PREFIX}line_or_bus', f'{TABLE_PREFIX}line_ex_bus'],
+        calculate_connected_buses),
+}
+
+
+def get_dependencies(name: str) -> list[str]:
+    if name.startswith(TABLE_PREFIX):
+        return []
+    if name not in INTERMEDIATES:
+        raise ValueError(f"Unknown intermediate '{name}'")
+    return INTERMEDIATES[name].dependencies
+
+
+def get_intermediate(recording: Recording, name: str) -> Any:
+    """
+    Value of an intermediate of the recording, computed on first use and then shared by all its KPIs. Values
+    are shared and must not be modified.
+    """
+    if name.startswith(TABLE_PREFIX):
+        return recording.table(name[len(TABLE_PREFIX):])
+    if name not in INTERMEDIATES:
+        raise ValueError(f"Unknown intermediate '{name}'")
+
+    def compute():
+        with profiling.stage(name):
+            return INTERMEDIATES[name].function(recording)
+    return recording.memoize(f'{INTERMEDIATE_PREFIX}{name}', compute)
@@ -0,0 +1,50 @@
+# Copyright (c) 2025, RTE (http://www.rte-france.com)
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+
+import importlib
+from importlib.metadata import entry_points
+
+from grid2evaluate.grid_kpi import GridKpi
+
+# entry point group of KPIs, so that other packages can register their own KPIs
+ENTRY_POINT_GROUP = 'grid2evaluate.kpis'
+
+# KPI class paths by name, also declared as entry points, so that they are found even if the package is not
+# installed. KPI modules, and their dependencies (pypowsybl and pandapower for network based KPIs), are only
+# imported when the KPI is used.
+BUILTIN_KPIS = {
+    'carbon_intensity': 'grid2evaluate.carbon_intensity_kpi:CarbonIntensityKpi',
+    'topological_action_complexity': 'grid2evaluate.topological_action_complexity_kpi:TopologicalActionComplexityKpi',
+    'network_utilization': 'grid2evaluate.network_utilization_kpi:NetworkUtilizationKpi',
+    'operation_score': 'grid2evaluate.operation_score_kpi:OperationScoreKpi',
+    'assistant_alert_accuracy': 'grid2evaluate.assistant_alert_accuracy_kpi:AssistantAlertAccuracyKpi',
+    'total_decision_time': 'grid2evaluate.total_decision_time_kpi:TotalDecisionTimeKpi',
+}
+
+
+def get_kpi_paths() -> dict[str, str]:
+    """
+    Class path ('module:class') of the available KPIs by name.
+    """
+    kpi_paths = dict(BUILTIN_KPIS)
+    kpi_paths.update({entry_point.name: entry_point.value for entry_point in entry_points(group=ENTRY_POINT_GROUP)})
+    return kpi_paths
+
+
+def get_kpi_names() -> list[str]:
+    return list(get_kpi_paths())
+
+
+def get_kpi_class(name: str) -> type[GridKpi]:
+    kpi_path = get_kpi_paths().get(name)
+    if kpi_path is None:
+        raise ValueError(f"Unknown KPI '{name}'")
+    module_name, _, class_name = kpi_path.partition(':')
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def create_kpi(name: str, **options) -> GridKpi:
+    return get_kpi_class(name)(**options)
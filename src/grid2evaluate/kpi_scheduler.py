@@ -0,0 +1,113 @@
+# Copyright (c) 2025, RTE (http://www.rte-france.com)
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Optional
+
+from grid2evaluate import profiling
+from grid2evaluate.grid_kpi import GridKpi
+from grid2evaluate.intermediates import get_dependencies, get_intermediate
+from grid2evaluate.recording import Recording
+from grid2evaluate.result_cache import KpiResultCache
+
+logger = logging.getLogger(__name__)
+
+# prefix of the graph nodes of KPIs, followed by the index of the KPI
+KPI_NODE_PREFIX = 'kpi:'
+
+
+class KpiScheduler:
+    """
+    Evaluation of several KPIs on a recording as a dependency graph: the intermediates declared by the KPIs
+    (see GridKpi.get_intermediates) and their own dependencies are computed once, before the KPIs using them.
+    With more than one worker, independent nodes run concurrently in a thread pool, so that the cheap KPIs
+    finish while the network utilization is still running (its security analysis runs in native code and in
+    its own worker processes).
+    """
+    def __init__(self, kpis: list[GridKpi], workers: int = 1):
+        self.kpis = kpis
+        self.workers = workers
+
+    def build_graph(self, kpi_indexes: list[int]) -> dict[str, list[str]]:
+        """
+        Dependencies of each node of the graph of the given KPIs, KPI nodes being named 'kpi:<index>'. Nodes
+        are in a topological order, dependencies first.
+        """
+        graph = {}
+
+        def add_node(name: str, dependencies: list[str]):
+            for dependency in dependencies:
+                if dependency not in graph:
+                    add_node(dependency, get_dependencies(dependency))
+            graph[name] = dependencies
+
+        for kpi_index in kpi_indexes:
+            add_node(f'{KPI_NODE_PREFIX}{kpi_index}', self.kpis[kpi_index].get_intermediates())
+        return graph
+
+    def evaluate(self, recording: Recording, cache: Optional[KpiResultCache] = None) -> list[tuple[list[float], float]]:
+        """
+        Evaluate the KPIs on a recording. Returns the values of each KPI, in order, with the wall time of
+        its evaluation, not including the intermediates computed for it beforehand.
+        """
+        results: dict[int, tuple[list[float], float]] = {}
+
+        # the cache is looked up once per KPI, and the intermediates of KPIs with cached values are not needed
+        uncached_kpi_indexes = []
+        for kpi_index, kpi in enumerate(self.kpis):
+            start = time.perf_counter()
+            values = None
+            if cache is not None:
+                with profiling.evaluating(kpi.name):
+                    values = kpi.get_cached(recording, cache)
+            if values is not None:
+                results[kpi_index] = (values, time.perf_counter() - start)
+            else:
+                uncached_kpi_indexes.append(kpi_index)
+        graph = self.build_graph(uncached_kpi_indexes)
+        logger.debug(f"Evaluation graph of '{recording.directory}': {graph}")
+
+        def run_node(name: str):
+            if name.startswith(KPI_NODE_PREFIX):
+                kpi_index = int(name[len(KPI_NODE_PREFIX):])
+                kpi = self.kpis[kpi_index]
+                start = time.perf_counter()
+                with profiling.evaluating(kpi.name):
+                    values = kpi.evaluate_uncached(recording, cache)
+                results[kpi_index] = (values, time.perf_counter() - start)
+            else:
+                get_intermediate(recording, name)
+
+        if self.workers <= 1:
+            for name in graph:
+                run_node(name)
+        else:
+            self._run_concurrently(graph, run_node)
+        return [results[kpi_index] for kpi_index in range(len(self.kpis))]
+
+    def _run_concurrently(self, graph: dict[str, list[str]], run_node):
+        remaining = dict(graph)
+        done = set()
+        running: dict[Future, str] = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            try:
+                while len(remaining) > 0 or len(running) > 0:
+                    # nodes are submitted in graph order, so the KPIs in the order they are given
+                    ready = [name for name, dependencies in remaining.items()
+                             if all(dependency in done for dependency in dependencies)]
+                    for name in ready:
+                        del remaining[name]
+                        running[executor.submit(run_node, name)] = name
+                    completed, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        name = running.pop(future)
+                        future.result()
+                        done.add(name)
+            finally:
+                for future in running:
+                    future.cancel()
@@ -0,0 +1,84 @@
+# Copyright (c) 2025, RTE (http://www.rte-france.com)
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+
+import logging
+from collections import Counter
+from typing import Optional
+
+import pypowsybl as pp
+
+from grid2evaluate import profiling
+
+logger = logging.getLogger(__name__)
+
+# rungs of the ladder, from the cheapest to the most robust
+RUNGS = ['warm', 'dc', 'flat', 'relaxed']
+
+# counters of the warm and cold (DC values) solves of the ladder, and of their Newton-Raphson iterations
+SOLVE_STATS = ['warm_solves', 'warm_iterations', 'cold_solves', 'cold_iterations']
+
+
+class LoadFlowLadder:
+    """
+    Load flows of consecutive steps chained on the same network: the load flow of a step is warm started from
+    the voltages of the previous converged step, then retried with more robust settings if it does not
+    converge: DC values init, flat start and flat start with a relaxed Newton-Raphson tolerance. The security
+    analysis of the step can then start from the converged state with the parameters of the rung that
+    converged.
+    stats counts the steps solved by each rung ('rung_<rung>', 'rung_failed' if none converged) and the
+    Newton-Raphson iterations of cold (DC values) and warm solves.
+    """
+    def __init__(self, relaxed_tolerance: float = 1e-2, relaxed_max_iterations: int = 30):
+        relaxed_provider_parameters = {'newtonRaphsonConvEpsPerEq': str(relaxed_tolerance),
+                                       'maxNewtonRaphsonIterations': str(relaxed_max_iterations)}
+        self._load_flow_parameters = {
+            'warm': pp.loadflow.Parameters(voltage_init_mode=pp.loadflow.VoltageInitMode.PREVIOUS_VALUES),
+            'dc': pp.loadflow.Parameters(voltage_init_mode=pp.loadflow.VoltageInitMode.DC_VALUES),
+            'flat': pp.loadflow.Parameters(voltage_init_mode=pp.loadflow.VoltageInitMode.UNIFORM_VALUES),
+            'relaxed': pp.loadflow.Parameters(voltage_init_mode=pp.loadflow.VoltageInitMode.UNIFORM_VALUES,
+                                              provider_parameters=relaxed_provider_parameters),
+        }
+        # the security analysis starts from the converged state, keeping the tolerance of the rung
+        self._security_analysis_parameters = pp.loadflow.Parameters(
+            voltage_init_mode=pp.loadflow.VoltageInitMode.PREVIOUS_VALUES)
+        self._relaxed_security_analysis_parameters = pp.loadflow.Parameters(
+            voltage_init_mode=pp.loadflow.VoltageInitMode.PREVIOUS_VALUES,
+            provider_parameters=relaxed_provider_parameters)
+        # whether the network holds the voltages of a converged load flow
+        self._warm = False
+        self.stats = Counter()
+
+    def solve(self, network: pp.network.Network, time_index: int) -> Optional[pp.loadflow.Parameters]:
+        """
+        Solve the load flow of the current network state, climbing the ladder until it converges. Returns the
+        parameters of the security analysis of the step, or None if no rung converged.
+        """
+        for rung in RUNGS if self._warm else RUNGS[1:]:
+            try:
+                with profiling.stage('loadflow', time_index):
+                    results = pp.loadflow.run_ac(network, self._load_flow_parameters[rung])
+            except pp.PyPowsyblError as e:
+                # a warm start fails on buses energized since the previous step, without voltage
+                logger.debug(f"Load flow at time {time_index} failed with rung '{rung}': {e}")
+                results = []
+            # the main connected component must converge
+            main_results = [result for result in results if result.connected_component_num == 0]
+            converged = len(main_results) > 0 and main_results[0].status == pp.loadflow.ComponentStatus.CONVERGED
+            if len(main_results) > 0 and rung in ('warm', 'dc'):
+                solve_kind = 'warm' if rung == 'warm' else 'cold'
+                self.stats[f'{solve_kind}_solves'] += 1
+                self.stats[f'{solve_kind}_iterations'] += sum(result.iteration_count for result in main_results)
+            if converged:
+                self._warm = True
+                self.stats[f'rung_{rung}'] += 1
+                profiling.count(f'loadflow_rung_{rung}', 1, time_index)
+                if rung != RUNGS[0]:
+                    logger.debug(f"Load flow at time {time_index} converged with rung '{rung}'")
+                return self._relaxed_security_analysis_parameters if rung == 'relaxed' else self._security_analysis_parameters
+        self._warm = False
+        self.stats['rung_failed'] += 1
+        profiling.count('loadflow_rung_failed', 1, time_index)
+        return None
@@ -4,29 +4,194 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 # SPDX-License-Identifier: MPL-2.0
 
+import argparse
+import glob
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+from typing import Optional
 
-from grid2evaluate.assistant_alert_accuracy_kpi import AssistantAlertAccuracyKpi
-from grid2evaluate.carbon_intensity_kpi import CarbonIntensityKpi
-from grid2evaluate.network_utilization_kpi import NetworkUtilizationKpi
-from grid2evaluate.operation_score_kpi import OperationScoreKpi
-from grid2evaluate.topological_action_complexity_kpi import TopologicalActionComplexityKpi
-from grid2evaluate.total_decision_time_kpi import TotalDecisionTimeKpi
-
-
-def main():
-    directory = Path('/tmp/rec')
-    kpis = [
-        CarbonIntensityKpi(),
-        TopologicalActionComplexityKpi(),
-        NetworkUtilizationKpi(),
-        OperationScoreKpi(),
-        AssistantAlertAccuracyKpi(),
-        TotalDecisionTimeKpi()
-    ]
-    for kpi in kpis:
-        value = kpi.evaluate(directory)
-        print(f"{kpi.name}={value}")
+import pyarrow as pa
+import pyarrow.csv as pcsv
+import pyarrow.parquet as pq
+
+from grid2evaluate import profiling
+from grid2evaluate.kpi_registry import create_kpi, get_kpi_names
+from grid2evaluate.kpi_scheduler import KpiScheduler
+from grid2evaluate.recording import Recording
+from grid2evaluate.result_cache import KpiResultCache
+
+logger = logging.getLogger(__name__)
+
+RESULTS_SCHEMA = pa.schema([
+    ('episode', pa.string()),
+    ('kpi', pa.string()),
+    ('metric_index', pa.int64()),
+    ('metric', pa.string()),
+    ('value', pa.float64()),
+    ('wall_time', pa.float64()),
+])
+
+
+def find_recordings(recordings: str) -> list[Path]:
+    """
+    Find recording directories, i.e. directories containing an env.json file, from a root directory (searched
+    recursively) or a glob pattern.
+    """
+    path = Path(recordings)
+    if path.is_dir():
+        directories = [env_path.parent for env_path in path.rglob('env.json')]
+    else:
+        directories = [Path(matched) for matched in glob.glob(recordings, recursive=True)]
+        directories = [directory for directory in directories if (directory / 'env.json').is_file()]
+    return sorted(directories)
+
+
+def evaluate_recording(directory: Path, kpi_names: list[str], cache: Optional[KpiResultCache] = None,
+                       profiled: bool = False,
+                       kpi_options: Optional[dict[str, dict]] = None,
+                       kpi_workers: int = 1) -> tuple[list[dict], Optional[pa.Table]]:
+    """
+    Evaluate the selected KPIs on one recording, sharing its loaded tables and intermediates, and return one
+    result row per KPI metric, and the profile of the evaluation if profiled. kpi_options gives the constructor
+    arguments of KPIs by name. With more than one KPI worker, independent KPIs are evaluated concurrently
+    (see KpiScheduler).
+    """
+    profiler = profiling.enable() if profiled else None
+    try:
+        recording = Recording(directory)
+        kpis = [create_kpi(kpi_name, **(kpi_options or {}).get(kpi_name, {})) for kpi_name in kpi_names]
+        rows = []
+        for kpi, (values, wall_time) in zip(kpis, KpiScheduler(kpis, kpi_workers).evaluate(recording, cache)):
+            value_names = kpi.get_value_names()
+            for metric_index, value in enumerate(values):
+                rows.append({'episode': str(directory), 'kpi': kpi.name, 'metric_index': metric_index,
+                             'metric': value_names[metric_index] if metric_index < len(value_names) else None,
+                             'value': float(value), 'wall_time': wall_time})
+    finally:
+        if profiled:
+            profiling.disable()
+    return rows, profiling.to_table(profiler.records, str(directory)) if profiler is not None else None
+
+
+def read_results(output: Path) -> pa.Table:
+    if not output.exists():
+        return RESULTS_SCHEMA.empty_table()
+    if output.suffix == '.csv':
+        results = pcsv.read_csv(output, convert_options=pcsv.ConvertOptions(column_types=RESULTS_SCHEMA))
+    else:
+        results = pq.read_table(output)
+    # results written before metric names were added
+    if 'metric' not in results.column_names:
+        results = results.append_column('metric', pa.nulls(len(results), pa.string()))
+    return results.select(RESULTS_SCHEMA.names).cast(RESULTS_SCHEMA)
+
+
+def write_results(results: pa.Table, output: Path):
+    # write to a temporary file first so that an interrupted run never leaves a truncated results table
+    tmp_output = output.with_name(output.name + '.tmp')
+    if output.suffix == '.csv':
+        pcsv.write_csv(results, tmp_output)
+    else:
+        pq.write_table(results, tmp_output)
+    os.replace(tmp_output, output)
+
+
+def evaluate_recordings(directories: list[Path], kpi_names: list[str], output: Path, workers: int = 1,
+                        cache: Optional[KpiResultCache] = None, profile_output: Optional[Path] = None,
+                        kpi_options: Optional[dict[str, dict]] = None, kpi_workers: int = 1) -> pa.Table:
+    """
+    Evaluate the selected KPIs on all recordings, one recording per worker process, and write the consolidated
+    results table to output after each evaluated recording. Recordings already present in output are skipped.
+    kpi_workers is the number of KPIs of a recording evaluated concurrently.
+    If profile_output is given, the wall time of the evaluation stages and counters of all evaluated recordings
+    are written to it (as JSON records if its extension is .json, Parquet otherwise) and summarized in the log.
+    """
+    results = read_results(output)
+    evaluated_episodes = set(results['episode'].to_pylist())
+    directories = [directory for directory in directories if str(directory) not in evaluated_episodes]
+    logger.info(f"{len(evaluated_episodes)} recordings already evaluated, {len(directories)} to evaluate")
+    if len(directories) == 0:
+        return results
+
+    profiles = []
+    # spawn rather than fork as the pypowsybl native library does not support being forked
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = {executor.submit(evaluate_recording, directory, kpi_names, cache, profile_output is not None,
+                                   kpi_options, kpi_workers): directory
+                   for directory in directories}
+        for future in as_completed(futures):
+            directory = futures[future]
+            try:
+                rows, profile = future.result()
+            except Exception:
+                logger.exception(f"Evaluation of '{directory}' failed")
+                continue
+            for row in rows:
+                logger.info(f"{row['episode']}: {row['kpi']}[{row['metric_index']}] {row['metric']}={row['value']}")
+            results = pa.concat_tables([results, pa.Table.from_pylist(rows, schema=RESULTS_SCHEMA)])
+            write_results(results, output)
+            if profile is not None:
+                profiles.append(profile)
+
+    if profile_output is not None:
+        profile = pa.concat_tables(profiles) if len(profiles) > 0 else profiling.PROFILE_SCHEMA.empty_table()
+        profiling.write_profile(profile, profile_output)
+        logger.info(f"Profile: {profiling.summarize(profile)}")
+    return results
+
+
+def main(args: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description='Evaluate KPIs on Grid2op recordings')
+    parser.add_argument('recordings', help='root directory of the recordings or glob pattern of recording directories')
+    parser.add_argument('-o', '--output', type=Path, default=Path('results.parquet'),
+                        help='results table, written as CSV if the file extension is .csv, Parquet otherwise')
+    parser.add_argument('-k', '--kpis', nargs='+', choices=get_kpi_names(), default=get_kpi_names(),
+                        help='KPIs to evaluate, all by default')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='number of recordings evaluated in parallel')
+    parser.add_argument('--kpi-workers', type=int, default=1,
+                        help='number of KPIs of a recording evaluated concurrently, in threads')
+    parser.add_argument('--cache-dir', type=Path,
+                        help='directory of the KPI result cache, results are not cached if not given')
+    parser.add_argument('--cache-max-size', type=int, default=100 * 1024 * 1024,
+                        help='maximum size in bytes of the KPI result cache')
+    parser.add_argument('--invalidate-cache', action='store_true',
+                        help='remove cached results of the selected recordings and KPIs instead of evaluating them')
+    parser.add_argument('--profile', type=Path,
+                        help='profile of the evaluation stages, written as JSON if the file extension is .json, '
+                             'Parquet otherwise')
+    parser.add_argument('--network-cache-dir', type=Path,
+                        help='directory of the cache of networks prepared from the environment grids')
+    parser.add_argument('--screening-threshold', type=float,
+                        help='estimated N-1 rho from which the AC security analysis is run on a contingency, the '
+                             'other ones being only estimated with a DC sensitivity analysis')
+    parser.add_argument('--violation-threshold', type=float,
+                        help='N-1 rho from which the (time, contingency, branch) entries of the network utilization '
+                             'are written to the .violations.parquet table of each recording')
+    parsed_args = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    directories = find_recordings(parsed_args.recordings)
+    cache = KpiResultCache(parsed_args.cache_dir, parsed_args.cache_max_size) if parsed_args.cache_dir else None
+    if parsed_args.invalidate_cache:
+        if cache is None:
+            parser.error('--invalidate-cache requires --cache-dir')
+        for directory in directories:
+            for kpi_name in parsed_args.kpis:
+                cache.invalidate(str(directory), create_kpi(kpi_name).name)
+        return
+    network_utilization_options = {}
+    if parsed_args.network_cache_dir:
+        network_utilization_options['network_cache_dir'] = parsed_args.network_cache_dir
+    if parsed_args.screening_threshold is not None:
+        network_utilization_options['screening_threshold'] = parsed_args.screening_threshold
+    if parsed_args.violation_threshold is not None:
+        network_utilization_options['violation_threshold'] = parsed_args.violation_threshold
+    kpi_options = {'network_utilization': network_utilization_options}
+    evaluate_recordings(directories, parsed_args.kpis, parsed_args.output, parsed_args.workers, cache,
+                        parsed_args.profile, kpi_options, parsed_args.kpi_workers)
 
 
 if __name__ == "__main__":
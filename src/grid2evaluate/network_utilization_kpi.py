@@ -4,30 +4,381 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 # SPDX-License-Identifier: MPL-2.0
 
+import json
 import logging
+import math
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Optional, Union
 
 import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 import pyarrow.parquet as pq
 import pypowsybl as pp
 
-from grid2evaluate.env_data import EnvData
+from grid2evaluate import profiling
+from grid2evaluate.checkpoint import KpiCheckpoint
+from grid2evaluate.dc_screening import DcScreening
 from grid2evaluate.grid_kpi import GridKpi
-from grid2evaluate.network_wrapper import NetworkWrapper
+from grid2evaluate.loadflow_ladder import LoadFlowLadder, RUNGS, SOLVE_STATS
+from grid2evaluate.network_wrapper import NetworkWrapper, NetworkTimeSeries
+from grid2evaluate.recording import Recording
+from grid2evaluate.rho_aggregates import FLOW_DTYPE, RhoAggregates, compute_rho, sum_by_step
+from grid2evaluate.rho_store import RhoStore
+from grid2evaluate.sampling import StepSample
+from grid2evaluate.security_analysis_cache import SecurityAnalysisCache
 
 logger = logging.getLogger(__name__)
 
+# state of a security analysis worker process, set once by _init_worker
+_worker_state = None
+
+
+def _init_worker(network_wrapper: NetworkWrapper, contingency_ids: list[str], monitored_element_ids: list[str],
+                 time_series: NetworkTimeSeries, done: np.ndarray,
+                 fingerprints: Optional[list[bytes]], cache_size: int, screening: Optional[DcScreening],
+                 continuation: bool, block_size: Optional[int], thermal_limits: Optional[np.ndarray],
+                 violation_threshold: Optional[float], profiled: bool):
+    global _worker_state
+    if profiled:
+        profiling.enable()
+    analysis = NetworkUtilizationKpi._create_analysis(contingency_ids, monitored_element_ids)
+    cache = SecurityAnalysisCache(cache_size) if fingerprints is not None else None
+    _worker_state = (network_wrapper, analysis, contingency_ids, monitored_element_ids,
+                     time_series, done, fingerprints, cache, screening, continuation, block_size,
+                     thermal_limits, violation_threshold)
+
+
+def _run_worker_chunk(time_indexes: range) -> tuple[tuple[Union[np.ndarray, RhoAggregates], np.ndarray, np.ndarray, Counter], list[profiling.ProfileRecord]]:
+    results = NetworkUtilizationKpi._run_steps(*_worker_state, time_indexes)
+    # profile records of the chunk are sent back to the main process
+    profiler = profiling.get_profiler()
+    return results, profiler.pop_records() if profiler is not None else []
+
+
+def _sum_in_order(total: np.ndarray, terms: np.ndarray) -> np.ndarray:
+    return np.cumsum(np.concatenate([[total], terms]))[-1]
+
+
 class NetworkUtilizationKpi(GridKpi):
-    def __init__(self):
+    # load flow ladder counters are no longer part of the values
+    version = "8"
+
+    input_files = ['actions.parquet', 'gen.parquet', 'load.parquet', 'storage.parquet', 'line.parquet',
+                   'gen_p.parquet', 'gen_v.parquet', 'gen_bus.parquet', 'load_p.parquet', 'load_q.parquet',
+                   'load_bus.parquet', 'storage_power.parquet', 'storage_bus.parquet', 'line_or_bus.parquet',
+                   'line_ex_bus.parquet', 'line_rho.parquet', 'line_thermal_limit.parquet', 'env.json']
+
+    value_names = ['rho_n_max', 'rho_n1_max', 'rho_n_avg', 'rho_n1_avg', 'overload_n', 'overload_n1', 'n_divergences',
+                   'n1_divergences']
+
+    # violations table of the last evaluation of a recording with a violation threshold, in its directory
+    VIOLATIONS_FILE_NAME = '.violations.parquet'
+
+    def __init__(self, delta_updates: bool = True, workers: int = 1, chunk_size: Optional[int] = None,
+                 cache_size: int = 0, cache_tolerance: float = 1e-6, checkpoint: bool = False,
+                 network_cache_dir: Optional[Union[str, Path]] = None, screening_threshold: Optional[float] = None,
+                 contingency_ids: Optional[list[str]] = None, monitored_element_ids: Optional[list[str]] = None,
+                 voltage_level_ids: Optional[list[str]] = None, substation_ids: Optional[list[str]] = None,
+                 max_contingencies: Optional[int] = None, max_monitored_elements: Optional[int] = None,
+                 sampling: Optional[str] = None, sampling_rate: float = 0.1, sampling_seed: int = 0,
+                 sampling_strata: int = 5, confidence_level: float = 0.95, continuation: bool = False,
+                 block_size: Optional[int] = None, violation_threshold: Optional[float] = None,
+                 persist_rho: bool = False):
+        """
+        The security analysis runs all branch contingencies and monitors all branches by default. Contingencies
+        and monitored branches can be given explicitly, by branch id or Grid2op line name, and both are
+        restricted to the branches with a side in one of the voltage levels or substations of the filters.
+        max_contingencies and max_monitored_elements then only keep the most critical ones, those with the
+        highest recorded rho (over the first evaluated steps with checkpoint, the selection being kept in
+        the checkpoint). N state rho, N-1 rho and overloads are only computed on the monitored branches.
+        With checkpoint, the partial state of the evaluation (rho aggregates and divergence counts) is saved in
+        the recording directory, so that the next evaluation only runs the security analysis on the steps
+        appended to the recording since then.
+        With a positive cache size, security analysis results are memoized by network state (see
+        run_security_analysis). Cache hits and misses depend on workers and chunk size, so they are only logged
+        and profiled, not added to the values.
+        With a network cache directory, the network prepared from the grid of the environment is loaded from
+        it (see NetworkWrapper.load).
+        With a screening threshold, post-contingency currents are first estimated with a DC sensitivity
+        analysis and the AC security analysis is only run on the contingencies of a step whose estimated max
+        rho reaches the threshold (0.8 for a 20% margin for instance), the other ones keeping the DC estimate
+        (see DcScreening). The numbers of skipped and AC (step, contingency) pairs are added to the values.
+        With a sampling method ('every_k', 'random' or 'stratified' by total load, see StepSample), the security
+        analysis only runs on a sample of about sampling_rate of the steps: N-1 rho average and overload
+        percentage are estimates and N-1 rho max and divergence counts are lower bounds. N state metrics stay
+        exact. The values are followed by a sampled flag (1 if some steps were not sampled, the N-1 metrics
+        being estimates and lower bounds, 0 if all steps were sampled, the N-1 metrics being exact), the
+        confidence interval bounds of both estimates and the fraction of AC steps saved.
+        With continuation, the load flow of each step is warm started from the previous step and retried with
+        more robust settings if it diverges, before running the security analysis from the converged state
+        (see LoadFlowLadder). The numbers of warm and cold (DC values) solves with their Newton-Raphson
+        iterations, and the number of steps solved by each rung of the ladder are logged and profiled, not
+        added to the values: the ladder restarts cold in each chunk and on a checkpoint resume.
+        With a block size, steps are loaded by blocks as network variants before running their security
+        analyses in sequence, and their results are converted at once. With continuation, the variant of each
+        step is only loaded once the previous one is solved, to be warm started from it.
+        With a violation threshold, the currents of the security analysis are not kept for all (step,
+        contingency, branch): N-1 rho is reduced step by step as results arrive, and only the entries whose
+        rho reaches the threshold (1 for limit violations) are kept, in the violations table (time,
+        contingency_id, branch_id, rho) written next to the recording (see read_violations). Values are
+        unchanged, followed by the number of entries above the threshold.
+        With persist_rho, N state rho, N-1 rho and divergences of each evaluated step are written to the rho
+        store of the recording (see RhoStore), to find the contingencies causing an overload without running
+        the security analysis again.
+        """
         super().__init__("Network utilization")
+        self.delta_updates = delta_updates
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.cache_size = cache_size
+        self.cache_tolerance = cache_tolerance
+        self.checkpoint = checkpoint
+        self.network_cache_dir = network_cache_dir
+        self.screening_threshold = screening_threshold
+        self.contingency_ids = contingency_ids
+        self.monitored_element_ids = monitored_element_ids
+        self.voltage_level_ids = voltage_level_ids
+        self.substation_ids = substation_ids
+        self.max_contingencies = max_contingencies
+        self.max_monitored_elements = max_monitored_elements
+        self.sampling = sampling
+        self.sampling_rate = sampling_rate
+        self.sampling_seed = sampling_seed
+        self.sampling_strata = sampling_strata
+        self.confidence_level = confidence_level
+        self.continuation = continuation
+        self.block_size = block_size
+        self.violation_threshold = violation_threshold
+        self.persist_rho = persist_rho
+        if sampling is not None and checkpoint:
+            raise ValueError("Sampling can not be combined with checkpoint")
+        if persist_rho and violation_threshold is not None:
+            raise ValueError("N-1 rho can not be persisted with a violation threshold, which does not keep it")
+
+    def get_value_names(self) -> list[str]:
+        value_names = list(self.value_names)
+        if self.screening_threshold is not None:
+            value_names += ['screened_pairs', 'ac_pairs']
+        if self.violation_threshold is not None:
+            value_names += ['violations']
+        if self.sampling is not None:
+            value_names += ['sampled', 'rho_n1_avg_low', 'rho_n1_avg_high', 'overload_n1_low', 'overload_n1_high',
+                            'saved_ac_step_fraction']
+        return value_names
+
+    def get_parameters(self) -> dict:
+        parameters = super().get_parameters()
+        # these parameters only change how the security analysis is run, not its results
+        performance_parameters = ['delta_updates', 'checkpoint', 'network_cache_dir', 'block_size']
+        if not self.continuation:
+            # with continuation, load flows are chained over the steps of a chunk, warm starts depend on them
+            performance_parameters += ['workers', 'chunk_size']
+        for performance_parameter in performance_parameters:
+            del parameters[performance_parameter]
+        return parameters
+
+    def get_input_files(self, recording: Recording) -> list[Path]:
+        return super().get_input_files(recording) + [NetworkWrapper.find_grid_path(Path(recording.env_data.json['path']))]
 
     @staticmethod
     def calculate_rho(line_rho) -> np.ndarray:
-        rho = np.zeros((len(line_rho[0]), len(line_rho.columns) - 1))
-        for branch_index, rho_col in enumerate(line_rho.columns[1:]):
-            for time_index, rho_value in enumerate(rho_col):
-                rho[time_index, branch_index] = rho_value.as_py()
-        return rho
+        return line_rho.select(line_rho.column_names[1:]).to_pandas().to_numpy(dtype=np.float64)
+
+    @staticmethod
+    def _create_analysis(contingency_ids: list[str], monitored_element_ids: list[str]) -> pp.security.SecurityAnalysis:
+        analysis = pp.security.create_analysis()
+        analysis.add_single_element_contingencies(contingency_ids)
+        analysis.add_monitored_elements(branch_ids=monitored_element_ids)
+        return analysis
+
+    @staticmethod
+    def _count_divergences(result: pp.security.SecurityAnalysisResult, time_index: int) -> tuple[int, int]:
+        # TODO what should be done in case of divergence on N and N-1 states ?
+        step_n_div = 0
+        step_n1_div = 0
+        if result.pre_contingency_result.status == pp.loadflow.ComponentStatus.CONVERGED:
+            for contingency_id, post_contingency_result in result.post_contingency_results.items():
+                if post_contingency_result.status != pp.security.ComputationStatus.CONVERGED:
+                    step_n1_div += 1
+                    logger.warning(
+                        f"Calculation failed at time {time_index} and contingency '{contingency_id}' with {post_contingency_result.status}")
+        else:
+            logger.warning(f"Calculation failed at time {time_index} with {result.pre_contingency_result.status}")
+            step_n_div += 1
+        if step_n_div > 0 or step_n1_div > 0:
+            profiling.count('n_divergences', step_n_div, time_index)
+            profiling.count('n1_divergences', step_n1_div, time_index)
+        return step_n_div, step_n1_div
+
+    @staticmethod
+    def _extract_flows(results: list[pp.security.SecurityAnalysisResult], flows_indexes: list[int], flows: np.ndarray,
+                       contingency_index: pd.Index, monitored_element_index: pd.Index):
+        """
+        Copy the post-contingency currents of the security analysis results of several steps into their
+        flows_indexes rows of the flows array, converting the branch results of all steps at once.
+        """
+        step_indexes = []
+        contingency_ids = []
+        branch_ids = []
+        currents = []
+        for flows_index, result in zip(flows_indexes, results):
+            branch_results = result.branch_results
+            step_indexes.append(np.full(len(branch_results), flows_index))
+            contingency_ids.append(branch_results.index.get_level_values('contingency_id').to_numpy())
+            branch_ids.append(branch_results.index.get_level_values('branch_id').to_numpy())
+            currents.append(branch_results[['i1', 'i2']].to_numpy())
+        step_indexes = np.concatenate(step_indexes)
+        # pre-contingency results (empty contingency id) are not part of the N-1 flows
+        contingency_indexes = contingency_index.get_indexer(np.concatenate(contingency_ids))
+        branch_indexes = monitored_element_index.get_indexer(np.concatenate(branch_ids))
+        found = (contingency_indexes != -1) & (branch_indexes != -1)
+        flows[step_indexes[found], contingency_indexes[found], branch_indexes[found]] = np.concatenate(currents)[found]
+
+    @staticmethod
+    def _run_steps(network_wrapper: NetworkWrapper,
+                   analysis: pp.security.SecurityAnalysis,
+                   contingency_ids: list[str],
+                   monitored_element_ids: list[str],
+                   time_series: NetworkTimeSeries,
+                   done: np.ndarray,
+                   fingerprints: Optional[list[bytes]],
+                   cache: Optional[SecurityAnalysisCache],
+                   screening: Optional[DcScreening],
+                   continuation: bool,
+                   block_size: Optional[int],
+                   thermal_limits: Optional[np.ndarray],
+                   violation_threshold: Optional[float],
+                   time_indexes: range) -> tuple[Union[np.ndarray, RhoAggregates], np.ndarray, np.ndarray, Counter]:
+        """
+        Run the security analysis of the given steps. Returns the (step, contingency, monitored branch, side)
+        currents, or with a violation threshold their RhoAggregates reduced block by block, with the N and
+        N-1 divergence counts of each step and statistics counters.
+        """
+        parameters = pp.loadflow.Parameters(voltage_init_mode=pp.loadflow.VoltageInitMode.DC_VALUES)
+        contingency_index = pd.Index(contingency_ids)
+        monitored_element_index = pd.Index(monitored_element_ids)
+        # currents of both sides of monitored branches, for each step and contingency, or only for the steps of
+        # a block when they are reduced
+        flows = None
+        block_aggregates = []
+        if violation_threshold is None:
+            flows = np.zeros((len(time_indexes), len(contingency_ids), len(monitored_element_ids), 2), dtype=FLOW_DTYPE)
+        # N and N-1 divergence counts of each step
+        n_div = np.zeros(len(time_indexes), dtype=int)
+        n1_div = np.zeros(len(time_indexes), dtype=int)
+        stats = Counter()
+        # load flows are chained over the consecutive steps of the run
+        ladder = LoadFlowLadder() if continuation else None
+        # without block size, each step is applied on the working variant and converted on its own
+        step_block_size = block_size if block_size is not None else 1
+        for block_start in range(0, len(time_indexes), step_block_size):
+            block_end = min(block_start + step_block_size, len(time_indexes))
+            if flows is not None:
+                block_flows = flows[block_start:block_end]
+            else:
+                block_flows = np.zeros((block_end - block_start, len(contingency_ids), len(monitored_element_ids), 2),
+                                       dtype=FLOW_DTYPE)
+            # steps of the block to solve, as (index in the block, time index)
+            block_steps = []
+            for flows_index in range(block_end - block_start):
+                time_index = time_indexes[block_start + flows_index]
+                if done[time_index]:
+                    continue
+
+                cached_result = cache.get(fingerprints[time_index]) if cache is not None else None
+                if cached_result is not None:
+                    step_flows, step_n_div, step_n1_div = cached_result
+                    block_flows[flows_index] = step_flows
+                    n_div[block_start + flows_index] = step_n_div
+                    n1_div[block_start + flows_index] = step_n1_div
+                    continue
+                block_steps.append((flows_index, time_index))
+
+            variant_ids = None
+            if block_size is not None and ladder is not None:
+                # with continuation, the variant of a step is cloned from the one of the previous step once solved,
+                # so that its load flow is warm started from it as without block size
+                variant_ids = []
+            elif block_size is not None:
+                variant_ids, update_counts = network_wrapper.load_variants(time_series, [time_index for _, time_index in block_steps])
+                stats['updated_elements'] += sum(update_counts.values())
+
+            results = []
+            step_divergences = []
+            try:
+                for step, (flows_index, time_index) in enumerate(block_steps):
+                    if variant_ids is not None and ladder is not None:
+                        variant_id, update_counts = network_wrapper.load_variant(time_series, time_index,
+                                                                                 variant_ids[-1] if variant_ids else None)
+                        variant_ids.append(variant_id)
+                        stats['updated_elements'] += sum(update_counts.values())
+                    elif variant_ids is not None:
+                        network_wrapper.network.set_working_variant(variant_ids[step])
+                    else:
+                        update_counts = network_wrapper.update_network(time_series, time_index)
+                        logger.debug(f"Updated elements at time {time_index}: {update_counts}")
+                        stats['updated_elements'] += sum(update_counts.values())
+
+                    step_analysis = analysis
+                    if screening is not None:
+                        with profiling.stage('dc_screening', time_index):
+                            estimated_flows, selected = screening.screen(network_wrapper.network, time_index)
+                        # screened out contingencies keep the DC estimate, the other ones are filled by the AC analysis
+                        block_flows[flows_index] = estimated_flows
+                        block_flows[flows_index, selected] = 0
+                        n_selected = int(np.count_nonzero(selected))
+                        stats['screened_pairs'] += len(contingency_ids) - n_selected
+                        stats['ac_pairs'] += n_selected
+                        step_analysis = NetworkUtilizationKpi._create_analysis(contingency_index[selected].tolist(),
+                                                                               monitored_element_ids)
+
+                    step_parameters = parameters
+                    if ladder is not None:
+                        ladder_parameters = ladder.solve(network_wrapper.network, time_index)
+                        if ladder_parameters is not None:
+                            step_parameters = ladder_parameters
+
+                    with profiling.stage('run_ac', time_index):
+                        result = step_analysis.run_ac(network_wrapper.network, step_parameters)
+                    results.append(result)
+                    step_divergences.append(NetworkUtilizationKpi._count_divergences(result, time_index))
+            finally:
+                if variant_ids is not None:
+                    network_wrapper.release_variants(variant_ids)
+
+            if len(results) > 0:
+                with profiling.stage('extract_flows'):
+                    NetworkUtilizationKpi._extract_flows(results, [flows_index for flows_index, _ in block_steps],
+                                                         block_flows, contingency_index, monitored_element_index)
+
+            for (flows_index, time_index), (step_n_div, step_n1_div) in zip(block_steps, step_divergences):
+                n_div[block_start + flows_index] = step_n_div
+                n1_div[block_start + flows_index] = step_n1_div
+                if cache is not None:
+                    cache.put(fingerprints[time_index], (block_flows[flows_index].copy(), step_n_div, step_n1_div))
+
+            if flows is None:
+                first_step = time_indexes[block_start]
+                with profiling.stage('reduce_rho'):
+                    block_aggregates.append(RhoAggregates.reduce(block_flows, thermal_limits[first_step:first_step + len(block_flows)],
+                                                                 violation_threshold, first_step))
+        if cache is not None:
+            stats['cache_hits'] = cache.hits
+            stats['cache_misses'] = cache.misses
+            # counters of a worker cache are cumulated across its chunks, only report the ones of this chunk
+            cache.hits = 0
+            cache.misses = 0
+        if ladder is not None:
+            stats.update(ladder.stats)
+        if flows is None:
+            return RhoAggregates.concatenate(block_aggregates), n_div, n1_div, stats
+        return flows, n_div, n1_div, stats
 
     @staticmethod
     def run_security_analysis(network_wrapper: NetworkWrapper,
@@ -37,127 +388,419 @@ class NetworkUtilizationKpi(GridKpi):
                               load_table, load_p, load_q, load_bus,
                               gen_table, gen_p, gen_v, gen_bus,
                               storage_table, storage_power, storage_bus,
-                              line_table, line_or_bus, line_ex_bus) -> tuple[list[dict], int, int]:
-        parameters = pp.loadflow.Parameters(voltage_init_mode=pp.loadflow.VoltageInitMode.DC_VALUES)
-        analysis = pp.security.create_analysis()
-        analysis.add_single_element_contingencies(contingency_ids)
-        analysis.add_monitored_elements(branch_ids=monitored_element_ids)
-        flows = [{} for _ in range(len(time_col))]
-        n_div = 0
-        n1_div = 0
-        for time_index in range(len(time_col)):
-            if done_col[time_index]:
-                continue
-
-            network_wrapper.update_network(load_table, load_p, load_q, load_bus,
-                                           gen_table, gen_p, gen_v, gen_bus,
-                                           storage_table, storage_power, storage_bus,
-                                           line_table, line_or_bus, line_ex_bus,
-                                           time_index)
-
-            result = analysis.run_ac(network_wrapper.network, parameters)
-
-            # TODO what should be done in case of divergence on N and N-1 states ?
-            if result.pre_contingency_result.status == pp.loadflow.ComponentStatus.CONVERGED:
-                for contingency_id, post_contingency_result in result.post_contingency_results.items():
-                    if post_contingency_result.status != pp.security.ComputationStatus.CONVERGED:
-                        n1_div += 1
-                        logger.warning(
-                            f"Calculation failed at time {time_index} and contingency '{contingency_id}' with {post_contingency_result.status}")
+                              line_table, line_or_bus, line_ex_bus,
+                              workers: int = 1, chunk_size: Optional[int] = None,
+                              cache_size: int = 0, cache_tolerance: float = 1e-6,
+                              screening: Optional[DcScreening] = None,
+                              continuation: bool = False,
+                              block_size: Optional[int] = None,
+                              thermal_limits: Optional[np.ndarray] = None,
+                              violation_threshold: Optional[float] = None) -> tuple[Union[np.ndarray, RhoAggregates], np.ndarray, np.ndarray, Counter]:
+        """
+        Run an AC security analysis for each step not flagged as done. With more than one worker, the steps
+        are split into chunks of consecutive steps evaluated in a process pool, results being merged back in
+        time order so that they are identical to a serial run.
+        With a positive cache size, results are memoized by network state fingerprint (injections quantized
+        with cache_tolerance and bus assignments), so that repeated states are not solved again.
+        With a screening, the AC analysis of a step only runs the contingencies selected by the DC screening.
+        With continuation, load flows are chained over consecutive steps (in each chunk with workers) by a
+        LoadFlowLadder.
+        With a block size, blocks of steps are loaded as network variants (see NetworkWrapper.load_variants)
+        whose security analysis results are converted at once.
+        Returns the (time, contingency, monitored branch, side) currents array, N and N-1 divergence counts of
+        each step and statistics counters of the run (updated elements, cache hits and misses). With a violation threshold,
+        currents are reduced as they are computed with the (time, monitored branch) thermal limits, and
+        RhoAggregates are returned instead of the currents array.
+        """
+        with profiling.stage('create_time_series'):
+            time_series = network_wrapper.create_time_series(load_table, load_p, load_q, load_bus,
+                                                             gen_table, gen_p, gen_v, gen_bus,
+                                                             storage_table, storage_power, storage_bus,
+                                                             line_table, line_or_bus, line_ex_bus)
+        done = done_col.to_numpy()
+        fingerprints = None
+        if cache_size > 0:
+            with profiling.stage('fingerprints'):
+                fingerprints = time_series.fingerprints(cache_tolerance)
+                if screening is not None:
+                    # screened results also depend on the thermal limits of the step
+                    fingerprints = [fingerprint + screening.thermal_limits[time_index].tobytes()
+                                    for time_index, fingerprint in enumerate(fingerprints)]
+        stats = Counter()
+        if workers > 1 and len(time_col) > 1:
+            if chunk_size is None:
+                chunk_size = max(1, math.ceil(len(time_col) / (workers * 4)))
+            chunks = [range(start, min(start + chunk_size, len(time_col)))
+                      for start in range(0, len(time_col), chunk_size)]
+            chunk_flows_or_aggregates = []
+            chunk_n_divs = []
+            chunk_n1_divs = []
+            # spawn rather than fork as the pypowsybl native library is already running in this process
+            with ProcessPoolExecutor(max_workers=min(workers, len(chunks)),
+                                     mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_worker,
+                                     initargs=(network_wrapper, contingency_ids, monitored_element_ids,
+                                               time_series, done, fingerprints, cache_size, screening,
+                                               continuation, block_size, thermal_limits, violation_threshold,
+                                               profiling.get_profiler() is not None)) as executor:
+                for chunk_results, chunk_records in executor.map(_run_worker_chunk, chunks):
+                    chunk_flows, chunk_n_div, chunk_n1_div, chunk_stats = chunk_results
+                    if profiling.get_profiler() is not None:
+                        profiling.get_profiler().add_records(chunk_records)
+                    chunk_flows_or_aggregates.append(chunk_flows)
+                    chunk_n_divs.append(chunk_n_div)
+                    chunk_n1_divs.append(chunk_n1_div)
+                    stats.update(chunk_stats)
+            n_div = np.concatenate(chunk_n_divs)
+            n1_div = np.concatenate(chunk_n1_divs)
+            if violation_threshold is None:
+                flows = np.concatenate(chunk_flows_or_aggregates)
             else:
-                logger.warning(f"Calculation failed at time {time_index} with {result.pre_contingency_result.status}")
-                n_div += 1
+                flows = RhoAggregates.concatenate(chunk_flows_or_aggregates)
+        else:
+            analysis = NetworkUtilizationKpi._create_analysis(contingency_ids, monitored_element_ids)
+            cache = SecurityAnalysisCache(cache_size) if fingerprints is not None else None
+            flows, n_div, n1_div, stats = NetworkUtilizationKpi._run_steps(network_wrapper, analysis,
+                                                                           contingency_ids, monitored_element_ids,
+                                                                           time_series, done, fingerprints, cache,
+                                                                           screening, continuation, block_size,
+                                                                           thermal_limits, violation_threshold,
+                                                                           range(len(time_col)))
+        logger.info(f"{stats['updated_elements']} network elements updated over {len(time_col)} steps")
+        if fingerprints is not None:
+            logger.info(f"Security analysis cache: {stats['cache_hits']} hits, {stats['cache_misses']} misses")
+            profiling.count('security_analysis_cache_hits', stats['cache_hits'])
+            profiling.count('security_analysis_cache_misses', stats['cache_misses'])
+        if screening is not None:
+            logger.info(f"DC screening: {stats['screened_pairs']} of {stats['screened_pairs'] + stats['ac_pairs']} "
+                        f"(step, contingency) pairs skipped")
+            profiling.count('screened_pairs', stats['screened_pairs'])
+            profiling.count('ac_pairs', stats['ac_pairs'])
+        if continuation:
+            rung_counts = ', '.join(f"{rung} {stats[f'rung_{rung}']}" for rung in RUNGS + ['failed'])
+            logger.info(f"Load flow ladder: steps by rung {rung_counts}, "
+                        f"{stats['warm_iterations']} iterations in {stats['warm_solves']} warm solves, "
+                        f"{stats['cold_iterations']} iterations in {stats['cold_solves']} cold solves")
+            for solve_stat in SOLVE_STATS:
+                profiling.count(f'loadflow_{solve_stat}', stats[solve_stat])
+        return flows, n_div, n1_div, stats
 
-            for (contingency_id, _, branch_id), row in result.branch_results.iterrows():
-                flows[time_index][(contingency_id, branch_id)] = (row.i1, row.i2)
-        return flows, n_div, n1_div
+    @staticmethod
+    def get_monitored_thermal_limits(network_wrapper: NetworkWrapper, monitored_element_ids: list[str],
+                                     line_table, line_thermal_limit) -> np.ndarray:
+        """
+        (time, monitored branch) array of the recorded thermal limits, infinite for branches without recorded
+        thermal limit.
+        """
+        # thermal limit columns are ordered like the line table
+        line_indexes = pd.Index(network_wrapper.get_branch_ids(line_table['name'])).get_indexer(monitored_element_ids)
+        thermal_limits = line_thermal_limit.select(line_thermal_limit.column_names[1:]).to_pandas().to_numpy(dtype=FLOW_DTYPE)
+        monitored_thermal_limits = thermal_limits[:, line_indexes]
+        monitored_thermal_limits[:, line_indexes == -1] = np.inf
+        return monitored_thermal_limits
 
     @staticmethod
     def compute_rho_n1(network_wrapper: NetworkWrapper,
                        contingency_ids: list[str],
                        monitored_element_ids: list[str],
-                       security_analysis_flows: list[dict],
+                       security_analysis_flows: np.ndarray,
                        time_col, line_table, line_thermal_limit) -> np.ndarray:
-        rho = np.zeros((len(time_col), len(contingency_ids), len(monitored_element_ids)))
-        branches = network_wrapper.get_branches(attributes=['name'])
-        for branch_index, (branch_name, thermal_limit_col) in enumerate(
-                zip(line_table['name'], line_thermal_limit.columns[1:])):
-            branch_id = NetworkWrapper.get_id_from_name(branches, branch_name.as_py())
-            for time_index in range(len(time_col)):
-                for contingency_index, contingency_id in enumerate(contingency_ids):
-                    flow = security_analysis_flows[time_index].get((contingency_id, branch_id))
-                    i1, i2 = flow if flow else (0, 0)
-                    rho1 = i1 / thermal_limit_col[time_index].as_py()
-                    rho2 = i2 / thermal_limit_col[time_index].as_py()
-                    rho[time_index][contingency_index][branch_index] = max(rho1, rho2)
-        return rho
-
-    def evaluate(self, directory: Path) -> list[float]:
-        action_table = pq.read_table(directory / 'actions.parquet')
+        """
+        Compute the (time, contingency, monitored branch) rho array, as the max of the rho of both sides of
+        each branch, from the security analysis currents and the recorded thermal limits.
+        """
+        # branches without recorded thermal limit have an infinite limit and so a zero rho
+        return compute_rho(security_analysis_flows,
+                           NetworkUtilizationKpi.get_monitored_thermal_limits(network_wrapper, monitored_element_ids,
+                                                                              line_table, line_thermal_limit))
+
+    def _select_branches(self, network_wrapper: NetworkWrapper, line_table, rho_n: np.ndarray) -> tuple[list[str], list[str]]:
+        """
+        Select the contingencies and the monitored branches of the security analysis, in network order.
+        """
+        network = network_wrapper.network
+        branches = network.get_branches(attributes=['voltage_level1_id', 'voltage_level2_id'])
+        in_filters = pd.Series(True, index=branches.index)
+        if self.voltage_level_ids is not None:
+            in_filters &= (branches['voltage_level1_id'].isin(self.voltage_level_ids)
+                           | branches['voltage_level2_id'].isin(self.voltage_level_ids))
+        if self.substation_ids is not None:
+            substation_ids = network.get_voltage_levels(attributes=['substation_id'])['substation_id']
+            in_filters &= (branches['voltage_level1_id'].map(substation_ids).isin(self.substation_ids)
+                           | branches['voltage_level2_id'].map(substation_ids).isin(self.substation_ids))
+
+        # criticality of a branch is its max recorded rho, branches that are not Grid2op lines come last
+        criticality = pd.Series(np.max(rho_n, axis=0, initial=-np.inf),
+                                index=network_wrapper.get_branch_ids(line_table['name']))
+        criticality = criticality.reindex(branches.index, fill_value=-np.inf)
+
+        def select(ids: Optional[list[str]], max_count: Optional[int]) -> list[str]:
+            selected = in_filters
+            if ids is not None:
+                # unknown ids or names raise a ValueError
+                selected = selected & branches.index.isin(network_wrapper.get_branch_ids(pa.array(ids, pa.string())))
+            if max_count is not None and max_count < selected.sum():
+                most_critical = criticality[selected].sort_values(ascending=False, kind='stable').index[:max_count]
+                selected = selected & branches.index.isin(most_critical)
+            return branches.index[selected].tolist()
+
+        return (select(self.contingency_ids, self.max_contingencies),
+                select(self.monitored_element_ids, self.max_monitored_elements))
+
+    @staticmethod
+    def _create_state() -> dict[str, np.ndarray]:
+        return {
+            'rho_n_max': np.array(-np.inf), 'rho_n_sum': np.array(0.0), 'rho_n_size': np.array(0),
+            'rho_n_overloads': np.array(0),
+            'rho_n1_max': np.array(-np.inf, dtype=FLOW_DTYPE), 'rho_n1_sum': np.array(0.0), 'rho_n1_size': np.array(0),
+            'rho_n1_overloads': np.array(0),
+            'n_div': np.array(0), 'n1_div': np.array(0),
+            'screened_pairs': np.array(0), 'ac_pairs': np.array(0),
+        }
+
+    def _update_state(self, recording: Recording, start: int, state: dict[str, np.ndarray]):
+        """
+        Aggregate the steps of the recording from start into the state.
+        """
+        action_table = recording.table('actions').slice(start)
         done_col = action_table['done']
 
-        gen_table = pq.read_table(directory / 'gen.parquet')
-        load_table = pq.read_table(directory / 'load.parquet')
-        storage_table = pq.read_table(directory / 'storage.parquet')
-        line_table = pq.read_table(directory / 'line.parquet')
-
-        gen_p = pq.read_table(directory / 'gen_p.parquet')
-        gen_v = pq.read_table(directory / 'gen_v.parquet')
-        gen_bus = pq.read_table(directory / 'gen_bus.parquet')
-        load_p = pq.read_table(directory / 'load_p.parquet')
-        load_q = pq.read_table(directory / 'load_q.parquet')
-        load_bus = pq.read_table(directory / 'load_bus.parquet')
-        storage_power = pq.read_table(directory / 'storage_power.parquet')
-        storage_bus = pq.read_table(directory / 'storage_bus.parquet')
-        line_or_bus = pq.read_table(directory / 'line_or_bus.parquet')
-        line_ex_bus = pq.read_table(directory / 'line_ex_bus.parquet')
-        line_rho = pq.read_table(directory / 'line_rho.parquet')
-        line_thermal_limit = pq.read_table(directory / 'line_thermal_limit.parquet')
+        gen_table = recording.table('gen')
+        load_table = recording.table('load')
+        storage_table = recording.table('storage')
+        line_table = recording.table('line')
+
+        gen_p = recording.table('gen_p').slice(start)
+        gen_v = recording.table('gen_v').slice(start)
+        gen_bus = recording.table('gen_bus').slice(start)
+        load_p = recording.table('load_p').slice(start)
+        load_q = recording.table('load_q').slice(start)
+        load_bus = recording.table('load_bus').slice(start)
+        storage_power = recording.table('storage_power').slice(start)
+        storage_bus = recording.table('storage_bus').slice(start)
+        line_or_bus = recording.table('line_or_bus').slice(start)
+        line_ex_bus = recording.table('line_ex_bus').slice(start)
+        line_rho = recording.table('line_rho').slice(start)
+        line_thermal_limit = recording.table('line_thermal_limit').slice(start)
+
+        env = recording.env_data
+        n_busbar_per_sub = env.json["n_busbar_per_sub"]
+
+        network_wrapper = NetworkWrapper.load(Path(env.json['path']), n_busbar_per_sub, self.network_cache_dir)
+        network_wrapper.delta_updates = self.delta_updates
+
+        time_col = gen_p['time']
 
         # step 1
         rho_n = self.calculate_rho(line_rho)
 
-        # step 2
-        rho_n_max = np.max(rho_n)
+        # the selection of a resumed evaluation is the one of its first steps
+        if 'contingency_ids' in state:
+            contingency_ids = state['contingency_ids'].tolist()
+            monitored_element_ids = state['monitored_element_ids'].tolist()
+        else:
+            contingency_ids, monitored_element_ids = self._select_branches(network_wrapper, line_table, rho_n)
+            state['contingency_ids'] = np.array(contingency_ids, dtype=str)
+            state['monitored_element_ids'] = np.array(monitored_element_ids, dtype=str)
+        logger.info(f"{len(contingency_ids)} contingencies, {len(monitored_element_ids)} monitored branches")
+        monitored_lines = np.isin(network_wrapper.get_branch_ids(line_table['name']), monitored_element_ids)
+        if not monitored_lines.all():
+            rho_n = rho_n[:, monitored_lines]
 
-        env = EnvData.load(directory)
-        n_busbar_per_sub = env.json["n_busbar_per_sub"]
+        # step 2
+        state['rho_n_max'] = np.max(np.append(rho_n, state['rho_n_max']))
 
-        network_wrapper = NetworkWrapper.load(Path(env.json['path']), n_busbar_per_sub)
+        if self.sampling is not None:
+            load_levels = load_p.select(load_p.column_names[1:]).to_pandas().to_numpy(dtype=np.float64).sum(axis=1)
+            sample = StepSample.create(self.sampling, len(time_col), self.sampling_rate, self.sampling_seed,
+                                       load_levels, self.sampling_strata)
+            state['sample_indexes'] = sample.indexes
+            state['sample_strata'] = sample.strata
+            state['sample_stratum_sizes'] = sample.stratum_sizes
+            state['ac_steps'] = np.array(np.count_nonzero(~done_col.to_numpy()))
+            # only the N-1 analysis is run on the sampled steps
+            (action_table, gen_p, gen_v, gen_bus, load_p, load_q, load_bus, storage_power, storage_bus,
+             line_or_bus, line_ex_bus, line_thermal_limit) = (
+                table.take(sample.indexes)
+                for table in (action_table, gen_p, gen_v, gen_bus, load_p, load_q, load_bus, storage_power,
+                              storage_bus, line_or_bus, line_ex_bus, line_thermal_limit))
+            done_col = action_table['done']
+            time_col = gen_p['time']
+            state['sample_ac_steps'] = np.array(np.count_nonzero(~done_col.to_numpy()))
 
-        time_col = gen_p['time']
+        # run a security analysis on the N-1 branch contingencies, monitoring the selected branches
+        thermal_limits = None
+        if self.screening_threshold is not None or self.violation_threshold is not None:
+            thermal_limits = self.get_monitored_thermal_limits(network_wrapper, monitored_element_ids,
+                                                               line_table, line_thermal_limit)
+        screening = None
+        if self.screening_threshold is not None:
+            screening = DcScreening(network_wrapper.network, contingency_ids, monitored_element_ids,
+                                    thermal_limits, self.screening_threshold)
+        flows, n_div, n1_div, stats = self.run_security_analysis(network_wrapper,
+                                                                 contingency_ids, monitored_element_ids,
+                                                                 time_col, done_col,
+                                                                 load_table, load_p, load_q, load_bus,
+                                                                 gen_table, gen_p, gen_v, gen_bus,
+                                                                 storage_table, storage_power, storage_bus,
+                                                                 line_table, line_or_bus, line_ex_bus,
+                                                                 self.workers, self.chunk_size,
+                                                                 self.cache_size, self.cache_tolerance,
+                                                                 screening, self.continuation, self.block_size,
+                                                                 thermal_limits, self.violation_threshold)
+        state['n_div'] += np.sum(n_div)
+        state['n1_div'] += np.sum(n1_div)
+        state['screened_pairs'] += stats['screened_pairs']
+        state['ac_pairs'] += stats['ac_pairs']
 
-        # run a security analysis on all N-1 branch contingency and monitoring all branches
-        all_branches_ids = network_wrapper.network.get_branches(attributes=[]).index.tolist()
-        contingency_ids = all_branches_ids
-        monitored_element_ids = all_branches_ids
-        flows, n_div, n1_div = self.run_security_analysis(network_wrapper,
-                                                          contingency_ids, monitored_element_ids,
-                                                          time_col, done_col,
-                                                          load_table, load_p, load_q, load_bus,
-                                                          gen_table, gen_p, gen_v, gen_bus,
-                                                          storage_table, storage_power, storage_bus,
-                                                          line_table, line_or_bus, line_ex_bus)
-
-        # step 3
-        rho_n1 = self.compute_rho_n1(network_wrapper,
-                                     contingency_ids, monitored_element_ids, flows,
-                                     time_col, line_table, line_thermal_limit)
+        # step 3, reduced to the max, sum and overload count of each step
+        if self.violation_threshold is None:
+            with profiling.stage('compute_rho_n1'):
+                rho_n1 = self.compute_rho_n1(network_wrapper,
+                                             contingency_ids, monitored_element_ids, flows,
+                                             time_col, line_table, line_thermal_limit)
+            rho_n1_step_max = np.max(rho_n1, axis=(1, 2), initial=-np.inf)
+            rho_n1_step_sum = sum_by_step(rho_n1)
+            rho_n1_step_overloads = np.sum(rho_n1 > 1, axis=(1, 2))
+            if self.persist_rho:
+                self._persist_rho(recording, start, network_wrapper, line_table, contingency_ids,
+                                  monitored_element_ids, time_col, rho_n, state.get('sample_indexes'), rho_n1,
+                                  n_div, n1_div)
+        else:
+            # rho has already been reduced while running the security analysis
+            aggregates = flows
+            rho_n1_step_max = aggregates.step_max
+            rho_n1_step_sum = aggregates.step_sum
+            rho_n1_step_overloads = aggregates.step_overloads
+            violations = pa.table({
+                'time': time_col.take(aggregates.violation_steps),
+                'contingency_id': pa.array(np.array(contingency_ids, dtype=object)[aggregates.violation_contingencies], pa.string()),
+                'branch_id': pa.array(np.array(monitored_element_ids, dtype=object)[aggregates.violation_branches], pa.string()),
+                'rho': aggregates.violation_rho,
+            })
+            logger.info(f"{len(violations)} N-1 rho values above {self.violation_threshold}")
+            self._persist_violations(recording, start, time_col[0], violations)
+        step_size = len(contingency_ids) * len(monitored_element_ids)
 
         # step 4
-        rho_n1_max = np.max(rho_n1)
+        state['rho_n1_max'] = np.max(np.append(rho_n1_step_max, state['rho_n1_max']))
 
-        # step 5
-        rho_n_avg = np.mean(rho_n)
+        # step 5 and 6, sums being accumulated step by step so that they do not depend on the evaluated steps
+        state['rho_n_sum'] = _sum_in_order(state['rho_n_sum'], sum_by_step(rho_n))
+        state['rho_n_size'] += np.size(rho_n)
+        state['rho_n1_sum'] = _sum_in_order(state['rho_n1_sum'], rho_n1_step_sum)
+        state['rho_n1_size'] += len(rho_n1_step_sum) * step_size
+
+        # step 7 and 8
+        state['rho_n_overloads'] += np.sum(rho_n > 1)
+        state['rho_n1_overloads'] += np.sum(rho_n1_step_overloads)
+
+        if self.sampling is not None:
+            # all steps have the same number of N-1 rho values, so the average is the mean of step averages
+            state['sample_rho_n1_avg'] = rho_n1_step_sum / max(1, step_size)
+            state['sample_overload_n1'] = rho_n1_step_overloads * 100.0 / max(1, step_size)
+
+    @staticmethod
+    def _persist_rho(recording: Recording, start: int, network_wrapper: NetworkWrapper, line_table,
+                     contingency_ids: list[str], monitored_element_ids: list[str], time_col,
+                     rho_n: np.ndarray, sample_indexes: Optional[np.ndarray], rho_n1: np.ndarray,
+                     n_div: np.ndarray, n1_div: np.ndarray):
+        # N state rho of the N-1 steps, reordered like the monitored branches, which may not all be lines
+        line_ids = network_wrapper.get_branch_ids(line_table['name'])
+        monitored_line_ids = line_ids[np.isin(line_ids, monitored_element_ids)]
+        rho_n_indexes = pd.Index(monitored_line_ids).get_indexer(monitored_element_ids)
+        if sample_indexes is not None:
+            rho_n = rho_n[sample_indexes]
+        branch_rho_n = np.full((len(rho_n), len(monitored_element_ids)), np.nan)
+        branch_rho_n[:, rho_n_indexes != -1] = rho_n[:, rho_n_indexes[rho_n_indexes != -1]]
+        with profiling.stage('persist_rho'):
+            RhoStore.of_recording(recording.directory).write(start, contingency_ids, monitored_element_ids,
+                                                             time_col.to_numpy(), branch_rho_n, rho_n1,
+                                                             n_div > 0, n1_div)
+
+    def _get_violations_parameters(self) -> bytes:
+        return json.dumps(self.get_parameters(), sort_keys=True, default=str).encode()
+
+    def read_violations(self, recording_directory: Path) -> Optional[pa.Table]:
+        """
+        Violations table (time, contingency_id, branch_id, rho) of the last evaluation of a recording with a
+        violation threshold, None if it has not been evaluated with the parameters of this KPI.
+        """
+        violations_path = recording_directory / self.VIOLATIONS_FILE_NAME
+        if not violations_path.exists():
+            return None
+        violations = pq.read_table(violations_path)
+        if (violations.schema.metadata or {}).get(b'parameters') != self._get_violations_parameters():
+            return None
+        return violations
+
+    def _persist_violations(self, recording: Recording, start: int, start_time: pa.Scalar, violations: pa.Table):
+        # a resumed evaluation keeps the violations of the steps evaluated before
+        if start > 0:
+            previous_violations = self.read_violations(recording.directory)
+            if previous_violations is None:
+                logger.warning(f"No violations of the steps before {start} in '{recording.directory}'")
+            else:
+                violations = pa.concat_tables([previous_violations.filter(pc.less(previous_violations['time'],
+                                                                                  start_time)),
+                                               violations])
+        violations = violations.replace_schema_metadata({'parameters': self._get_violations_parameters()})
+        # written to a temporary file first so that an interrupted write never leaves a truncated table
+        violations_path = recording.directory / self.VIOLATIONS_FILE_NAME
+        tmp_path = violations_path.with_name(f"{violations_path.name}.{os.getpid()}.tmp")
+        pq.write_table(violations, tmp_path)
+        os.replace(tmp_path, violations_path)
 
-        # step 6
-        rho_n1_avg = np.mean(rho_n1)
+    def _estimate_sampled_values(self, state: dict[str, np.ndarray]) -> tuple[float, float, list[float]]:
+        """
+        N-1 rho average and overload percentage estimated from the sampled steps, and the additional values
+        of the sampling: sampled flag, confidence interval bounds of both estimates and fraction of AC steps
+        saved.
+        """
+        sample = StepSample(state['sample_indexes'], state['sample_strata'], state['sample_stratum_sizes'])
+        rho_n1_avg, rho_n1_avg_low, rho_n1_avg_high = sample.estimate_mean(state['sample_rho_n1_avg'],
+                                                                           self.confidence_level)
+        overload_n1, overload_n1_low, overload_n1_high = sample.estimate_mean(state['sample_overload_n1'],
+                                                                              self.confidence_level)
+        ac_steps = int(state['ac_steps'])
+        saved_fraction = 1 - int(state['sample_ac_steps']) / ac_steps if ac_steps > 0 else 0.0
+        logger.info(f"N-1 metrics estimated on {len(sample.indexes)} of {sample.n_steps} steps "
+                    f"({saved_fraction:.1%} of AC steps saved): rho avg {rho_n1_avg:.4f} "
+                    f"[{rho_n1_avg_low:.4f}, {rho_n1_avg_high:.4f}], overload {overload_n1:.4f}% "
+                    f"[{overload_n1_low:.4f}, {overload_n1_high:.4f}], rho max and divergences are lower bounds")
+        # with all steps sampled, estimates and lower bounds are the exact values
+        sampled = 1 if len(sample.indexes) < sample.n_steps else 0
+        return rho_n1_avg, overload_n1, [sampled, rho_n1_avg_low, rho_n1_avg_high, overload_n1_low, overload_n1_high,
+                                         saved_fraction]
 
-        # step 7
-        overload_n = np.sum(rho_n > 1) * 100.0 / np.size(rho_n)
+    def _evaluate(self, recording: Recording) -> list[float]:
+        checkpoint = KpiCheckpoint(self, recording) if self.checkpoint else None
+        time_col = recording.time_column('gen_p')
+        start, state = checkpoint.load(time_col) if checkpoint is not None else (0, None)
+        if state is None:
+            state = self._create_state()
+        if start < len(time_col):
+            self._update_state(recording, start, state)
+        if checkpoint is not None:
+            checkpoint.save(len(time_col), time_col[-1].as_py() if len(time_col) > 0 else None, state)
 
-        # step 8
-        overload_n1 = np.sum(rho_n1 > 1) * 100.0 / np.size(rho_n1)
+        rho_n_max = state['rho_n_max'][()]
+        rho_n1_max = state['rho_n1_max'][()]
+        rho_n_avg = state['rho_n_sum'] / state['rho_n_size']
+        rho_n1_avg = state['rho_n1_sum'] / state['rho_n1_size']
+        overload_n = state['rho_n_overloads'] * 100.0 / state['rho_n_size']
+        overload_n1 = state['rho_n1_overloads'] * 100.0 / state['rho_n1_size']
+        sampling_values = []
+        if self.sampling is not None:
+            rho_n1_avg, overload_n1, sampling_values = self._estimate_sampled_values(state)
 
         # step 9
-        return [rho_n_max, rho_n1_max, rho_n_avg, rho_n1_avg, overload_n, overload_n1, n_div, n1_div]
+        values = [rho_n_max, rho_n1_max, rho_n_avg, rho_n1_avg, overload_n, overload_n1,
+                  int(state['n_div']), int(state['n1_div'])]
+        if self.screening_threshold is not None:
+            values += [int(state['screened_pairs']), int(state['ac_pairs'])]
+        if self.violation_threshold is not None:
+            violations = self.read_violations(recording.directory)
+            values += [len(violations) if violations is not None else 0]
+        values += sampling_values
+        return values
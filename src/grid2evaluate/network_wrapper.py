@@ -5,16 +5,107 @@
 # SPDX-License-Identifier: MPL-2.0
 
 import glob
+import hashlib
+import logging
+import os
+import pickle
+from collections import Counter
 from pathlib import Path
+from typing import Optional, Union
 
-import pandapower as pdp
+import numpy as np
 import pandas as pd
 import pypowsybl as pp
+from pyarrow import Table, ChunkedArray
+
+from grid2evaluate import profiling
+from grid2evaluate.result_cache import hash_file
+
+logger = logging.getLogger(__name__)
+
+# to be increased when a change of the network preparation or of the index invalidates cached networks
+PREPARED_NETWORK_VERSION = "1"
+
+# variant of a loaded network, and prefix of the variants of blocks of steps (see NetworkWrapper.load_variants)
+INITIAL_VARIANT_ID = 'InitialState'
+STEP_VARIANT_PREFIX = 'step_'
+
+
+class ElementTimeSeries:
+    """
+    Attributes to update on one type of network element for each step of an episode. Each attribute is a
+    (time, element) array whose columns are ordered like the element ids.
+    """
+    def __init__(self, ids: np.ndarray, attributes: dict[str, np.ndarray]):
+        self.ids = ids
+        self.attributes = attributes
+
+    def __len__(self):
+        return len(self.ids)
+
+    def changed_at(self, time_index: int, previous_time_index: int) -> np.ndarray:
+        """
+        Get the mask of elements having at least one attribute different between two steps.
+        """
+        changed = np.zeros(len(self.ids), dtype=bool)
+        for matrix in self.attributes.values():
+            changed |= matrix[time_index] != matrix[previous_time_index]
+        return changed
+
+    def at(self, time_index: int, mask: Optional[np.ndarray] = None) -> dict[str, np.ndarray]:
+        """
+        Get update arguments of the elements at a given step, optionally restricted to a mask of elements.
+        """
+        values = {'id': self.ids if mask is None else self.ids[mask]}
+        for name, matrix in self.attributes.items():
+            values[name] = matrix[time_index] if mask is None else matrix[time_index][mask]
+        return values
+
+
+class NetworkTimeSeries:
+    """
+    Loads, generators, batteries and branches attributes to apply on the network for each step of an episode.
+    """
+    def __init__(self, loads: ElementTimeSeries, generators: ElementTimeSeries,
+                 batteries: ElementTimeSeries, branches: ElementTimeSeries):
+        self.loads = loads
+        self.generators = generators
+        self.batteries = batteries
+        self.branches = branches
+
+    def fingerprints(self, tolerance: float) -> list[bytes]:
+        """
+        Get a fingerprint of the network state at each step, from all injections quantized with the given
+        tolerance (exact values if not positive) and all bus assignments.
+        """
+        columns = []
+        for elements in [self.loads, self.generators, self.batteries, self.branches]:
+            for matrix in elements.attributes.values():
+                if matrix.dtype == object:
+                    _, codes = np.unique(matrix, return_inverse=True)
+                    columns.append(codes.reshape(matrix.shape).astype(np.int64))
+                elif matrix.dtype == bool:
+                    columns.append(matrix.astype(np.int64))
+                elif tolerance > 0:
+                    columns.append(np.round(matrix / tolerance).astype(np.int64))
+                else:
+                    columns.append(matrix.astype(np.float64).view(np.int64))
+        states = np.ascontiguousarray(np.concatenate(columns, axis=1))
+        return [hashlib.blake2b(state.tobytes(), digest_size=16).digest() for state in states]
 
 
 class NetworkWrapper:
-    def __init__(self, network: pp.network.Network):
+    def __init__(self, network: pp.network.Network, delta_updates: bool = False):
         self._network = network
+        self.delta_updates = delta_updates
+        self._last_update = None
+        self._build_index()
+
+    def __getstate__(self):
+        # the last applied step is only valid for this instance of the network
+        state = self.__dict__.copy()
+        state['_last_update'] = None
+        return state
 
     @property
     def network(self) -> pp.network.Network:
@@ -47,35 +138,71 @@ class NetworkWrapper:
             voltage_level_ids = [voltage_level_id] * len(bus_nums_to_create)
             network.create_buses(id=bus_ids, voltage_level_id=voltage_level_ids)
 
-    @classmethod
-    def load(cls, directory: Path, n_busbar_per_sub: int) -> 'NetworkWrapper':
+    @staticmethod
+    def find_grid_path(directory: Path) -> Path:
         grid_paths = glob.glob(str(directory / "grid.*"))
-        grid_path = grid_paths[0]
-        if grid_path.endswith('.json'):
-            n_pdp = pdp.from_json(grid_path)
+        return Path(grid_paths[0])
+
+    @classmethod
+    def _load_network(cls, grid_path: Path, n_busbar_per_sub: int) -> pp.network.Network:
+        if grid_path.suffix == '.json':
+            # pandapower is slow to import and only needed for pandapower grids
+            import pandapower as pdp
+            n_pdp = pdp.from_json(str(grid_path))
             network = pp.network.convert_from_pandapower(n_pdp)
         else:
-            network = pp.network.load(grid_path)
+            network = pp.network.load(str(grid_path))
 
         # we need to convert to bus breaker topo to apply Grid2op style topology
         cls._convert_to_bus_breaker_topo(network)
 
         # also, to apply Grid2op topology, we need to reach the n_busbar_per_sub buses for each voltage level
         cls._create_extra_buses(network, n_busbar_per_sub)
+        return network
 
-        return NetworkWrapper(network)
+    @staticmethod
+    def get_cache_key(grid_path: Path, n_busbar_per_sub: int) -> str:
+        key = f"{hash_file(grid_path)}-{n_busbar_per_sub}-{PREPARED_NETWORK_VERSION}-{pp.__version__}"
+        return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
 
     @classmethod
-    def _fill_bus_id_and_connected(cls, name: str, bus_local_num: int, bus_id: list[str], connected: list[bool],
-                                   elements: pd.DataFrame, buses: pd.DataFrame, voltage_level_id_attr: str):
-        if bus_local_num == -1:
-            bus_id.append("")
-            connected.append(False)
-        else:
-            voltage_level_id = cls._get_voltage_level_id_from_name(elements, name, voltage_level_id_attr)
-            local_bus_id = buses[(buses['voltage_level_id'] == voltage_level_id) & (buses['local_num'] == bus_local_num - 1)].iloc[0].name
-            bus_id.append(local_bus_id)
-            connected.append(True)
+    def load(cls, directory: Path, n_busbar_per_sub: int,
+             cache_directory: Optional[Union[str, Path]] = None) -> 'NetworkWrapper':
+        """
+        Load the grid of a directory and prepare it to apply Grid2op values. If a cache directory is given, the
+        prepared network and its index are stored in it the first time, keyed by the grid file content and
+        the number of busbars per substation, so that next loads only deserialize them.
+        """
+        with profiling.stage('network_load'):
+            grid_path = cls.find_grid_path(directory)
+            cache_path = None
+            if cache_directory is not None:
+                cache_directory = Path(cache_directory)
+                cache_path = cache_directory / f"{cls.get_cache_key(grid_path, n_busbar_per_sub)}.pkl"
+                if cache_path.exists():
+                    try:
+                        with open(cache_path, 'rb') as f:
+                            network_wrapper = pickle.load(f)
+                        logger.debug(f"Prepared network of '{grid_path}' loaded from '{cache_path}'")
+                        return network_wrapper
+                    except Exception:
+                        logger.warning(f"Cannot load prepared network from '{cache_path}', preparing it again", exc_info=True)
+
+            network_wrapper = NetworkWrapper(cls._load_network(grid_path, n_busbar_per_sub))
+
+            if cache_path is not None:
+                cache_directory.mkdir(parents=True, exist_ok=True)
+                tmp_cache_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+                with open(tmp_cache_path, 'wb') as f:
+                    pickle.dump(network_wrapper, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_cache_path, cache_path)
+            return network_wrapper
+
+    def get_branches(self, attributes: list[str]) -> pd.DataFrame:
+        # TODO waiting to a fix on pypowsybl to be able to get name attribute with network.get_branches(attributes=['name', 'voltage_level1_id', 'voltage_level2_id'])
+        lines = self._network.get_lines(attributes=attributes)
+        transfos = self._network.get_2_windings_transformers(attributes=attributes)
+        return pd.concat([lines, transfos])
 
     @staticmethod
     def get_id_from_name(elements: pd.DataFrame, name: str) -> str:
@@ -85,94 +212,181 @@ class NetworkWrapper:
             if filtered.empty:
                 return ""
             else:
-                return name  
+                return name
         return found_element.iloc[0].name
 
     @staticmethod
-    def _get_voltage_level_id_from_name(elements: pd.DataFrame, name: str, voltage_level_id_attr: str) -> str:
-        return elements[(elements['name'] == name)].iloc[0][voltage_level_id_attr]
-
-    def _update_loads(self, load_table, load_p, load_q, load_bus, time_index: int, loads: pd.DataFrame, buses: pd.DataFrame):
-        id = []
-        p0 = []
-        q0 = []
-        bus_id = []
-        connected = []
-        for name, p_col, q_col, bus_col in zip(load_table['name'], load_p.columns[1:], load_q.columns[1:], load_bus.columns[1:]):
-            id.append(self.get_id_from_name(loads, name.as_py()))
-            p0.append(p_col[time_index].as_py())
-            q0.append(q_col[time_index].as_py())
-            self._fill_bus_id_and_connected(name=name.as_py(), bus_local_num=bus_col[time_index].as_py(), bus_id=bus_id,
-                                            connected=connected, elements=loads, buses=buses, voltage_level_id_attr='voltage_level_id')
-        self._network.update_loads(id=id, p0=p0, q0=q0, bus_breaker_bus_id=bus_id, connected=connected)
-
-    def _update_generators(self, gen_table, gen_p, gen_v, gen_bus, time_index: int, generators: pd.DataFrame, buses: pd.DataFrame):
-        id = []
-        target_p = []
-        target_v = []
-        voltage_regulator_on = []
-        bus_id = []
-        connected = []
-        for name, p_col, v_col, bus_col in zip(gen_table['name'], gen_p.columns[1:], gen_v.columns[1:], gen_bus.columns[1:]):
-            id.append(self.get_id_from_name(generators, name.as_py()))
-            target_p.append(p_col[time_index].as_py())
-            v = v_col[time_index].as_py()
-            voltage_regulator_on.append(False if v <= 0 else True)
-            target_v.append(v)
-            self._fill_bus_id_and_connected(name=name.as_py(), bus_local_num=bus_col[time_index].as_py(), bus_id=bus_id,
-                                            connected=connected, elements=generators, buses=buses, voltage_level_id_attr='voltage_level_id')
-        self._network.update_generators(id=id, target_p=target_p, voltage_regulator_on=voltage_regulator_on, target_v=target_v, bus_breaker_bus_id=bus_id, connected=connected)
-
-    def _update_batteries(self, storage_table, storage_power, storage_bus, time_index: int, batteries: pd.DataFrame, buses: pd.DataFrame):
-        id = []
-        target_p = []
-        target_q = []
-        bus_id = []
-        connected = []
-        for name, p_col, bus_col in zip(storage_table['name'], storage_power.columns[1:], storage_bus.columns[1:]):
-            id.append(self.get_id_from_name(batteries, name.as_py()))
-            target_p.append(p_col[time_index].as_py())
-            target_q.append(0.0)
-            self._fill_bus_id_and_connected(name=name.as_py(), bus_local_num=bus_col[time_index].as_py(), bus_id=bus_id,
-                                            connected=connected, elements=batteries, buses=buses, voltage_level_id_attr='voltage_level_id')
-        self._network.update_batteries(id=id, target_p=target_p, target_q=target_q, bus_breaker_bus_id=bus_id, connected=connected)
-
-    def _update_lines(self, line_table, line_or_bus, line_ex_bus, time_index: int, branches: pd.DataFrame, buses: pd.DataFrame):
-        id = []
-        bus1_id = []
-        connected1 = []
-        bus2_id = []
-        connected2 = []
-        for name, bus1_col, bus2_col in zip(line_table['name'], line_or_bus.columns[1:], line_ex_bus.columns[1:]):
-            id.append(self.get_id_from_name(branches, name.as_py()))
-            self._fill_bus_id_and_connected(name=name.as_py(), bus_local_num=bus1_col[time_index].as_py(), bus_id=bus1_id,
-                                            connected=connected1, elements=branches, buses=buses, voltage_level_id_attr='voltage_level1_id')
-            self._fill_bus_id_and_connected(name=name.as_py(), bus_local_num=bus2_col[time_index].as_py(), bus_id=bus2_id,
-                                            connected=connected2, elements=branches, buses=buses, voltage_level_id_attr='voltage_level2_id')
-        self._network.update_branches(id=id, bus_breaker_bus1_id=bus1_id, connected1=connected1, bus_breaker_bus2_id=bus2_id, connected2=connected2)
+    def _index_ids(elements: pd.DataFrame) -> dict[str, str]:
+        # an element is found by its name first, then by its id, as in get_id_from_name
+        ids = {element_id: element_id for element_id in elements.index}
+        first_named = elements[~elements['name'].duplicated()]
+        ids.update(zip(first_named['name'], first_named.index))
+        return ids
 
-    def get_branches(self, attributes: list[str]) -> pd.DataFrame:
-        # TODO waiting to a fix on pypowsybl to be able to get name attribute with network.get_branches(attributes=['name', 'voltage_level1_id', 'voltage_level2_id'])
-        lines = self._network.get_lines(attributes=attributes)
-        transfos = self._network.get_2_windings_transformers(attributes=attributes)
-        return pd.concat([lines, transfos])
+    def _index_voltage_levels(self, elements: pd.DataFrame, voltage_level_id_attr: str) -> pd.Series:
+        return elements[voltage_level_id_attr].map(self._voltage_level_nums)
+
+    def _build_index(self):
+        """
+        Build once the static index needed to apply Grid2op values on the network: ids of elements by
+        Grid2op name, voltage level of each element and bus breaker bus id by voltage level and local bus number.
+        """
+        buses = self._get_numbered_buses(self._network).dropna(subset=['voltage_level_id'])
+        voltage_level_ids = buses['voltage_level_id'].unique()
+        self._voltage_level_nums = {voltage_level_id: num for num, voltage_level_id in enumerate(voltage_level_ids)}
+        # column 0 is for disconnected elements, then Grid2op local bus numbers start at 1
+        n_bus_max = int(buses['local_num'].max()) + 1 if len(buses) > 0 else 0
+        self._bus_ids = np.full((len(voltage_level_ids), n_bus_max + 1), "", dtype=object)
+        self._bus_ids[buses['voltage_level_id'].map(self._voltage_level_nums).to_numpy(),
+                      buses['local_num'].to_numpy(dtype=int) + 1] = buses.index.to_numpy()
 
-    def update_network(self,
-                       load_table, load_p, load_q, load_bus,
-                       gen_table, gen_p, gen_q, gen_bus,
-                       storage_table, storage_power, storage_bus,
-                       line_table, line_or_bus, line_ex_bus,
-                       time_index: int):
         loads = self._network.get_loads(attributes=['name', 'voltage_level_id'])
         generators = self._network.get_generators(attributes=['name', 'voltage_level_id'])
         batteries = self._network.get_batteries(attributes=['name', 'voltage_level_id'])
         branches = self.get_branches(attributes=['name', 'voltage_level1_id', 'voltage_level2_id'])
-        buses = self._get_numbered_buses(self._network)
-        if (len(loads) > 0):
-            self._update_loads(load_table, load_p, load_q, load_bus, time_index, loads, buses)
-        if (len(generators) > 0):
-            self._update_generators(gen_table, gen_p, gen_q, gen_bus, time_index, generators, buses)
-        if (len(batteries) > 0):
-            self._update_batteries(storage_table, storage_power, storage_bus, time_index, batteries, buses)
-        if (len(branches) > 0):
-            self._update_lines(line_table, line_or_bus, line_ex_bus, time_index, branches, buses)
+        self._load_ids = self._index_ids(loads)
+        self._generator_ids = self._index_ids(generators)
+        self._battery_ids = self._index_ids(batteries)
+        self._branch_ids = self._index_ids(branches)
+        self._load_voltage_levels = self._index_voltage_levels(loads, 'voltage_level_id')
+        self._generator_voltage_levels = self._index_voltage_levels(generators, 'voltage_level_id')
+        self._battery_voltage_levels = self._index_voltage_levels(batteries, 'voltage_level_id')
+        self._branch_voltage_levels1 = self._index_voltage_levels(branches, 'voltage_level1_id')
+        self._branch_voltage_levels2 = self._index_voltage_levels(branches, 'voltage_level2_id')
+
+    @staticmethod
+    def _get_ids(names: ChunkedArray, ids_by_name: dict[str, str]) -> np.ndarray:
+        ids = []
+        for name in names.to_pylist():
+            element_id = ids_by_name.get(name)
+            if element_id is None:
+                raise ValueError(f"Element '{name}' not found in the network")
+            ids.append(element_id)
+        return np.array(ids, dtype=object)
+
+    def get_branch_ids(self, names: ChunkedArray) -> np.ndarray:
+        return self._get_ids(names, self._branch_ids)
+
+    @staticmethod
+    def _to_matrix(table: Table, dtype) -> np.ndarray:
+        # first column is time, then one column per element in the same order as the element table
+        matrix = np.empty((table.num_rows, table.num_columns - 1), dtype=dtype)
+        for index, col in enumerate(table.columns[1:]):
+            matrix[:, index] = col.to_numpy()
+        return matrix
+
+    def _get_bus_ids(self, ids: np.ndarray, voltage_levels: pd.Series, bus_table: Table) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Translate a whole episode of Grid2op local bus numbers to bus breaker bus ids with a single gather.
+        """
+        bus_local_nums = self._to_matrix(bus_table, np.int64)
+        connected = bus_local_nums != -1
+        voltage_level_nums = voltage_levels.loc[ids].to_numpy(dtype=int)
+        bus_ids = self._bus_ids[voltage_level_nums[np.newaxis, :], np.where(connected, bus_local_nums, 0)]
+        return bus_ids, connected
+
+    def create_time_series(self,
+                           load_table, load_p, load_q, load_bus,
+                           gen_table, gen_p, gen_v, gen_bus,
+                           storage_table, storage_power, storage_bus,
+                           line_table, line_or_bus, line_ex_bus) -> NetworkTimeSeries:
+        """
+        Convert the recorded tables of an episode to the network attributes of each step.
+        """
+        load_ids = self._get_ids(load_table['name'], self._load_ids)
+        load_bus_id, load_connected = self._get_bus_ids(load_ids, self._load_voltage_levels, load_bus)
+        loads = ElementTimeSeries(load_ids, {'p0': self._to_matrix(load_p, np.float64),
+                                             'q0': self._to_matrix(load_q, np.float64),
+                                             'bus_breaker_bus_id': load_bus_id,
+                                             'connected': load_connected})
+
+        gen_ids = self._get_ids(gen_table['name'], self._generator_ids)
+        gen_bus_id, gen_connected = self._get_bus_ids(gen_ids, self._generator_voltage_levels, gen_bus)
+        target_v = self._to_matrix(gen_v, np.float64)
+        generators = ElementTimeSeries(gen_ids, {'target_p': self._to_matrix(gen_p, np.float64),
+                                                 'voltage_regulator_on': target_v > 0,
+                                                 'target_v': target_v,
+                                                 'bus_breaker_bus_id': gen_bus_id,
+                                                 'connected': gen_connected})
+
+        battery_ids = self._get_ids(storage_table['name'], self._battery_ids)
+        battery_bus_id, battery_connected = self._get_bus_ids(battery_ids, self._battery_voltage_levels, storage_bus)
+        batteries = ElementTimeSeries(battery_ids, {'target_p': self._to_matrix(storage_power, np.float64),
+                                                    'target_q': np.zeros((storage_power.num_rows, len(battery_ids))),
+                                                    'bus_breaker_bus_id': battery_bus_id,
+                                                    'connected': battery_connected})
+
+        branch_ids = self._get_ids(line_table['name'], self._branch_ids)
+        bus1_id, connected1 = self._get_bus_ids(branch_ids, self._branch_voltage_levels1, line_or_bus)
+        bus2_id, connected2 = self._get_bus_ids(branch_ids, self._branch_voltage_levels2, line_ex_bus)
+        branches = ElementTimeSeries(branch_ids, {'bus_breaker_bus1_id': bus1_id,
+                                                  'connected1': connected1,
+                                                  'bus_breaker_bus2_id': bus2_id,
+                                                  'connected2': connected2})
+
+        return NetworkTimeSeries(loads, generators, batteries, branches)
+
+    def update_network(self, time_series: NetworkTimeSeries, time_index: int) -> dict[str, int]:
+        """
+        Apply the values of a step on the network and return the number of updated elements by type.
+        In delta mode, only elements whose values differ from the previously applied step of the same time
+        series are sent to the network.
+        """
+        with profiling.stage('update_network', time_index):
+            previous_time_index = None
+            if self.delta_updates and self._last_update is not None and self._last_update[0] is time_series:
+                previous_time_index = self._last_update[1]
+            update_counts = {}
+            for element_type, elements, update in [('loads', time_series.loads, self._network.update_loads),
+                                                   ('generators', time_series.generators, self._network.update_generators),
+                                                   ('batteries', time_series.batteries, self._network.update_batteries),
+                                                   ('branches', time_series.branches, self._network.update_branches)]:
+                mask = None if previous_time_index is None else elements.changed_at(time_index, previous_time_index)
+                update_count = len(elements) if mask is None else int(np.count_nonzero(mask))
+                if update_count > 0:
+                    update(**elements.at(time_index, mask))
+                update_counts[element_type] = update_count
+            self._last_update = (time_series, time_index)
+            return update_counts
+
+    def load_variants(self, time_series: NetworkTimeSeries, time_indexes: list[int]) -> tuple[list[str], Counter]:
+        """
+        Load a block of steps as network variants, each one cloned from the variant of the previous step of the
+        block so that delta updates still apply. The initial variant is left unchanged until the variants are
+        released. Returns the variant ids and the number of updated elements by type.
+        """
+        variant_ids = []
+        update_counts = Counter()
+        try:
+            for time_index in time_indexes:
+                variant_id, variant_update_counts = self.load_variant(time_series, time_index,
+                                                                      variant_ids[-1] if variant_ids else None)
+                variant_ids.append(variant_id)
+                update_counts.update(variant_update_counts)
+        finally:
+            self._network.set_working_variant(INITIAL_VARIANT_ID)
+        return variant_ids, update_counts
+
+    def load_variant(self, time_series: NetworkTimeSeries, time_index: int,
+                     source_variant_id: Optional[str] = None) -> tuple[str, dict[str, int]]:
+        """
+        Load a step as a network variant cloned from the given variant (the initial one by default), with its
+        state, and make it the working variant. Returns the variant id and the number of updated elements by
+        type.
+        """
+        variant_id = f"{STEP_VARIANT_PREFIX}{time_index}"
+        self._network.clone_variant(source_variant_id if source_variant_id is not None else INITIAL_VARIANT_ID,
+                                    variant_id, True)
+        self._network.set_working_variant(variant_id)
+        return variant_id, self.update_network(time_series, time_index)
+
+    def release_variants(self, variant_ids: list[str]):
+        """
+        Remove the variants of a block, the initial variant taking the state of the last step of the
+        block, from which next updates are applied.
+        """
+        self._network.set_working_variant(INITIAL_VARIANT_ID)
+        if len(variant_ids) > 0:
+            self._network.clone_variant(variant_ids[-1], INITIAL_VARIANT_ID, True)
+        for variant_id in variant_ids:
+            self._network.remove_variant(variant_id)
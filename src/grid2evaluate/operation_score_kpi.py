@@ -4,70 +4,121 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 # SPDX-License-Identifier: MPL-2.0
 
-from pathlib import Path
+from typing import Optional, Union
 
-import pyarrow.parquet as pq
+import numpy as np
 
+from grid2evaluate import profiling
 from grid2evaluate.actions import Actions
-from grid2evaluate.energy_util import calculate_dispatched_energy_by_generator, \
-    calculate_curtailment_energy_by_generator, calculate_lost_energy_by_generator, \
-    calculate_balancing_energy_by_generator, calculate_blackout_energy
+from grid2evaluate.checkpoint import KpiCheckpoint
+from grid2evaluate.energy_util import calculate_energies_by_batch, EnergyCalculator, ENERGY_NAMES
 from grid2evaluate.grid_kpi import GridKpi
+from grid2evaluate.intermediates import get_intermediate
+from grid2evaluate.recording import Recording, DEFAULT_BATCH_SIZE
 
 
 class OperationScoreKpi(GridKpi):
-    def __init__(self):
-        super().__init__("Operation score")
+    # the lost energy is summed step by step again, except with batches or checkpoint
+    version = "3"
+
+    input_files = ['actions.parquet', 'gen.parquet', 'gen_actual_dispatch.parquet', 'gen_target_dispatch.parquet',
+                   'gen_p_before_curtail.parquet', 'gen_p.parquet', 'load.parquet', 'load_p.parquet']
 
-    def evaluate(self, directory: Path) -> list[float]:
-        action_table = pq.read_table(directory / 'actions.parquet')
-        actions = Actions.load(action_table)
+    intermediates = ['topo_action_counts', 'redispatch_action_counts', 'curtail_action_counts'] \
+        + [f'{energy_name}_energy' for energy_name in ENERGY_NAMES]
+
+    value_names = ['n_topo_actions', 'n_redispatch_actions', 'redispatch_energy', 'balancing_energy',
+                   'n_curtail_actions', 'curtailment_energy', 'lost_energy', 'blackout_energy']
+
+    def __init__(self, batch_size: Optional[int] = None, checkpoint: bool = False):
+        """
+        With a batch size, time series tables are streamed by batches of this number of rows instead of being
+        fully loaded, to bound memory on long recordings.
+        With checkpoint, the partial state of the evaluation is saved in the recording directory, so that the
+        next evaluation only processes the steps appended to the recording since then.
+        """
+        super().__init__("Operation score")
+        self.batch_size = batch_size
+        self.checkpoint = checkpoint
+
+    def get_intermediates(self) -> list[str]:
+        if self.checkpoint:
+            # the evaluation resumes from the checkpoint, streaming the new steps by batches
+            return []
+        if self.batch_size is not None:
+            return self.intermediates[:3]
+        return self.intermediates
+
+    def _calculate_energies(self, recording: Recording) -> dict[str, Union[list[float], float]]:
+        if self.batch_size is not None:
+            return calculate_energies_by_batch(recording, ENERGY_NAMES, self.batch_size)
+
+        return {energy_name: get_intermediate(recording, f'{energy_name}_energy') for energy_name in ENERGY_NAMES}
+
+    def _evaluate_incrementally(self, recording: Recording) -> list[float]:
+        checkpoint = KpiCheckpoint(self, recording)
+        calculator = EnergyCalculator(ENERGY_NAMES, recording.table('gen')['name'], recording.table('load')['name'])
+        start, state = checkpoint.load(recording.time_column('gen_p'))
+        if state is None:
+            state = {'n_topo_sum': np.array(0), 'n_redispatch_sum': np.array(0), 'n_curtail_sum': np.array(0)}
+        else:
+            calculator.set_state(state, start, checkpoint.last_time)
+
+        columns = calculator.get_columns()
+        columns['actions'] = ['action', 'done']
+        batch_size = self.batch_size if self.batch_size is not None else DEFAULT_BATCH_SIZE
+        for batches in recording.iter_batches(columns, batch_size, start):
+            calculator.add(batches)
+            actions = Actions.load(batches['actions'])
+            state['n_topo_sum'] += actions.count_topo_actions().sum()
+            state['n_redispatch_sum'] += actions.count_redispatch_actions().sum()
+            state['n_curtail_sum'] += actions.count_curtail_actions().sum()
+        state.update(calculator.get_state())
+        checkpoint.save(calculator.time_index, calculator.last_time, state)
+
+        energies = calculator.get_energies()
+        return [int(state['n_topo_sum']), int(state['n_redispatch_sum']), sum(energies['dispatched']),
+                sum(energies['balancing']), int(state['n_curtail_sum']), sum(energies['curtailment']),
+                energies['lost'], energies['blackout']]
+
+    def _evaluate(self, recording: Recording) -> list[float]:
+        if self.checkpoint:
+            return self._evaluate_incrementally(recording)
+
+        with profiling.stage('calculate_energies'):
+            energies = self._calculate_energies(recording)
 
         # step 1
-        topo_actions = actions.filter_topo_actions()
-        n_topo = [len(acts) for acts in topo_actions]
+        n_topo = get_intermediate(recording, 'topo_action_counts')
 
         # step 2
-        n_topo_sum = sum(n_topo)
-
-        # step 3
-        redispatch_actions = actions.filter_redispatch_actions()
+        n_topo_sum = int(n_topo.sum())
 
-        # step 4
-        n_redispatch = [len(acts) for acts in redispatch_actions]
+        # step 3 and 4
+        n_redispatch = get_intermediate(recording, 'redispatch_action_counts')
 
         # step 5
-        n_redispatch_sum = sum(n_redispatch)
+        n_redispatch_sum = int(n_redispatch.sum())
 
         # step 6
-        gen_table = pq.read_table(directory / 'gen.parquet')
-        gen_actual_dispatch_table = pq.read_table(directory / 'gen_actual_dispatch.parquet')
-        e_redispatch = sum(calculate_dispatched_energy_by_generator(gen_table, gen_actual_dispatch_table))
+        e_redispatch = sum(energies['dispatched'])
 
         # step 7
-        gen_target_dispatch_table = pq.read_table(directory / 'gen_target_dispatch.parquet')
-        e_balancing = sum(calculate_balancing_energy_by_generator(gen_table, gen_actual_dispatch_table, gen_target_dispatch_table))
-
-        # step 8
-        curtail_actions = actions.filter_curtail_actions()
+        e_balancing = sum(energies['balancing'])
 
-        # step 9
-        n_curtail = [len(acts) for acts in curtail_actions]
+        # step 8 and 9
+        n_curtail = get_intermediate(recording, 'curtail_action_counts')
 
         # step 10
-        n_curtail_sum = sum(n_curtail)
+        n_curtail_sum = int(n_curtail.sum())
 
         # step 11
-        gen_p_before_curtail_table = pq.read_table(directory / 'gen_p_before_curtail.parquet')
-        gen_p_table = pq.read_table(directory / 'gen_p.parquet')
-        e_curtailment = sum(calculate_curtailment_energy_by_generator(gen_table, gen_p_before_curtail_table, gen_p_table))
+        e_curtailment = sum(energies['curtailment'])
 
         # step 12
-        load_table = pq.read_table(directory / 'load.parquet')
-        load_p_table = pq.read_table(directory / 'load_p.parquet')
-        e_lost = calculate_lost_energy_by_generator(gen_table, gen_p_table, load_table, load_p_table)
+        e_lost = energies['lost']
 
         # step 13
-        e_blackout = calculate_blackout_energy(action_table, load_table, load_p_table)
+        e_blackout = energies['blackout']
 
         return [n_topo_sum, n_redispatch_sum, e_redispatch, e_balancing, n_curtail_sum, e_curtailment, e_lost, e_blackout]
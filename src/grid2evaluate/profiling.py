@@ -0,0 +1,153 @@
+# Copyright (c) 2025, RTE (http://www.rte-france.com)
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Iterator, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+PROFILE_SCHEMA = pa.schema([
+    ('episode', pa.string()),
+    ('kpi', pa.string()),
+    ('stage', pa.string()),
+    ('time_index', pa.int64()),
+    ('count', pa.int64()),
+    ('wall_time', pa.float64()),
+])
+
+# record of a timed stage or of a counter (without wall time): kpi, stage, time index (-1 if not specific to a
+# time step), count (calls of the stage or counter value), wall time
+ProfileRecord = tuple[Optional[str], str, int, int, Optional[float]]
+
+
+class Profiler:
+    """
+    Wall time and number of calls of the stages of the KPI evaluations, and counters (divergences, cache
+    hits...), optionally by time step. Records are labelled with the KPI being evaluated by the current thread.
+    """
+    def __init__(self):
+        self._local = threading.local()
+        self.records: list[ProfileRecord] = []
+
+    @property
+    def kpi(self) -> Optional[str]:
+        return getattr(self._local, 'kpi', None)
+
+    @kpi.setter
+    def kpi(self, kpi_name: Optional[str]):
+        self._local.kpi = kpi_name
+
+    @contextmanager
+    def stage(self, name: str, time_index: int = -1) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.records.append((self.kpi, name, time_index, 1, time.perf_counter() - start))
+
+    @contextmanager
+    def evaluating(self, kpi_name: str) -> Iterator[None]:
+        previous_kpi = self.kpi
+        self.kpi = kpi_name
+        try:
+            with self.stage('evaluate'):
+                yield
+        finally:
+            self.kpi = previous_kpi
+
+    def count(self, name: str, value: int = 1, time_index: int = -1):
+        self.records.append((self.kpi, name, time_index, int(value), None))
+
+    def add_records(self, records: list[ProfileRecord]):
+        """
+        Add records of another process (a security analysis worker for instance), labelled with the KPI
+        being evaluated.
+        """
+        self.records.extend((self.kpi, name, time_index, count, wall_time)
+                            for _, name, time_index, count, wall_time in records)
+
+    def pop_records(self) -> list[ProfileRecord]:
+        records = self.records
+        self.records = []
+        return records
+
+
+# profiler of the current process, profiling is disabled if None
+_profiler: Optional[Profiler] = None
+
+_NOT_PROFILED = nullcontext()
+
+
+def enable() -> Profiler:
+    global _profiler
+    _profiler = Profiler()
+    return _profiler
+
+
+def disable():
+    global _profiler
+    _profiler = None
+
+
+def get_profiler() -> Optional[Profiler]:
+    return _profiler
+
+
+def stage(name: str, time_index: int = -1):
+    """
+    Context manager timing a stage, doing nothing if profiling is disabled.
+    """
+    return _profiler.stage(name, time_index) if _profiler is not None else _NOT_PROFILED
+
+
+def evaluating(kpi_name: str):
+    return _profiler.evaluating(kpi_name) if _profiler is not None else _NOT_PROFILED
+
+
+def count(name: str, value: int = 1, time_index: int = -1):
+    if _profiler is not None:
+        _profiler.count(name, value, time_index)
+
+
+def to_table(records: list[ProfileRecord], episode: str) -> pa.Table:
+    return pa.Table.from_pylist([{'episode': episode, 'kpi': kpi, 'stage': name, 'time_index': time_index,
+                                  'count': count, 'wall_time': wall_time}
+                                 for kpi, name, time_index, count, wall_time in records], schema=PROFILE_SCHEMA)
+
+
+def write_profile(profile: pa.Table, output: Path):
+    """
+    Write a profile table, as JSON records if the file extension is .json, Parquet otherwise.
+    """
+    if output.suffix == '.json':
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(profile.to_pylist(), f)
+    else:
+        pq.write_table(profile, output)
+
+
+def summarize(profile: pa.Table) -> str:
+    """
+    One line summary of a profile: total wall time and calls of each stage, slowest first, then counter totals.
+    """
+    wall_times = defaultdict(float)
+    calls = defaultdict(int)
+    counters = defaultdict(int)
+    for record in profile.select(['stage', 'count', 'wall_time']).to_pylist():
+        if record['wall_time'] is None:
+            counters[record['stage']] += record['count']
+        else:
+            wall_times[record['stage']] += record['wall_time']
+            calls[record['stage']] += record['count']
+    stages = [f"{name} {wall_time:.3f}s/{calls[name]} calls"
+              for name, wall_time in sorted(wall_times.items(), key=lambda item: item[1], reverse=True)]
+    return ', '.join(stages + [f"{name}={value}" for name, value in sorted(counters.items())])
@@ -0,0 +1,125 @@
+# Copyright (c) 2025, RTE (http://www.rte-france.com)
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+
+import threading
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional, Union
+
+import pyarrow.parquet as pq
+from pyarrow import ChunkedArray, RecordBatch, Table
+
+from grid2evaluate import profiling
+from grid2evaluate.actions import Actions
+from grid2evaluate.env_data import EnvData
+
+DEFAULT_BATCH_SIZE = 64 * 1024
+
+# prefix of the memoization keys of tables
+TABLE_PREFIX = 'table:'
+
+
+class Recording:
+    """
+    Data recorded for one episode in a directory. Parquet tables, environment data and parsed actions are
+    lazily loaded on first access and memoized, so that each file is read only once whatever the number of
+    KPIs evaluated on the recording, even by concurrent threads.
+    """
+    def __init__(self, directory: Path):
+        self._directory = directory
+        self._values: dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._key_locks: dict[str, threading.Lock] = {}
+
+    @staticmethod
+    def of(recording: Union[Path, 'Recording']) -> 'Recording':
+        return recording if isinstance(recording, Recording) else Recording(Path(recording))
+
+    @property
+    def directory(self) -> Path:
+        return self._directory
+
+    def memoize(self, key: str, compute: Callable[[], Any]) -> Any:
+        """
+        Value of the recording computed once by compute and memoized by key. Threads asking for a value being
+        computed wait for it.
+        """
+        with self._lock:
+            if key in self._values:
+                return self._values[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self._values:
+                self._values[key] = compute()
+        return self._values[key]
+
+    def _read_table(self, name: str) -> Table:
+        with profiling.stage('read_table'):
+            return pq.read_table(self._directory / f'{name}.parquet', memory_map=True)
+
+    def table(self, name: str) -> Table:
+        """
+        Get a table by its name, which is the parquet file name without extension (for instance 'gen_p').
+        """
+        return self.memoize(f'{TABLE_PREFIX}{name}', lambda: self._read_table(name))
+
+    def time_column(self, name: str) -> ChunkedArray:
+        """
+        Time column of a table, read alone if the table is not already loaded.
+        """
+        table = self._values.get(f'{TABLE_PREFIX}{name}')
+        if table is not None:
+            return table['time']
+        return pq.read_table(self._directory / f'{name}.parquet', columns=['time'], memory_map=True)['time']
+
+    def _read_batches(self, name: str, columns: Optional[list[str]], batch_size: int, start: int) -> Iterator[RecordBatch]:
+        parquet_file = pq.ParquetFile(self._directory / f'{name}.parquet', memory_map=True)
+        # row groups before the start row are not read at all
+        first_row_group = 0
+        while first_row_group < parquet_file.num_row_groups \
+                and start >= parquet_file.metadata.row_group(first_row_group).num_rows:
+            start -= parquet_file.metadata.row_group(first_row_group).num_rows
+            first_row_group += 1
+        if first_row_group == parquet_file.num_row_groups:
+            return
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns,
+                                               row_groups=range(first_row_group, parquet_file.num_row_groups)):
+            if start > 0:
+                skipped_rows = min(start, batch.num_rows)
+                batch = batch.slice(skipped_rows)
+                start -= skipped_rows
+            if batch.num_rows > 0:
+                yield batch
+
+    def iter_batches(self, columns: dict[str, Optional[list[str]]], batch_size: int = DEFAULT_BATCH_SIZE,
+                     start: int = 0) -> Iterator[dict[str, RecordBatch]]:
+        """
+        Iterate over several tables in lockstep from the start row, by batches of at most batch_size rows,
+        without loading the tables in memory. columns gives the columns to read by table name (all columns if
+        None); tables are expected to have the same number of rows. Each item maps table names to record
+        batches of the same rows.
+        """
+        readers = {name: self._read_batches(name, table_columns, batch_size, start)
+                   for name, table_columns in columns.items()}
+        # batches are usually aligned, but a reader may split them differently: keep the remaining rows of
+        # the longest batches for the next item
+        pending = {name: None for name in readers}
+        while True:
+            for name, reader in readers.items():
+                if pending[name] is None or pending[name].num_rows == 0:
+                    pending[name] = next(reader, None)
+            if any(batch is None for batch in pending.values()):
+                return
+            num_rows = min(batch.num_rows for batch in pending.values())
+            yield {name: batch.slice(0, num_rows) for name, batch in pending.items()}
+            pending = {name: batch.slice(num_rows) for name, batch in pending.items()}
+
+    @property
+    def env_data(self) -> EnvData:
+        return self.memoize('env_data', lambda: EnvData.load(self._directory))
+
+    @property
+    def actions(self) -> Actions:
+        return self.memoize('actions', lambda: Actions.load(self.table('actions')))
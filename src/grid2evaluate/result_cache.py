@@ -0,0 +1,137 @@
+# Copyright (c) 2025, RTE (http://www.rte-france.com)
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Optional, TYPE_CHECKING
+
+import numpy as np
+
+from grid2evaluate import profiling
+from grid2evaluate.recording import Recording
+
+if TYPE_CHECKING:
+    from grid2evaluate.grid_kpi import GridKpi
+
+logger = logging.getLogger(__name__)
+
+
+def hash_file(path: Path) -> str:
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+class KpiResultCache:
+    """
+    On-disk cache of KPI values, keyed by the recording directory, the content of the input files of the KPI
+    on it, the KPI class, its version and its parameters. Entries are JSON files in the cache directory; least recently used
+    entries are evicted when the total size exceeds max_size bytes.
+    """
+    def __init__(self, directory: Path, max_size: int = 100 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._file_hashes: dict[tuple[str, int, int], str] = {}
+        directory.mkdir(parents=True, exist_ok=True)
+
+    def _hash_file(self, path: Path) -> str:
+        # files are only hashed again when they have been modified
+        stat = path.stat()
+        stat_key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+        file_hash = self._file_hashes.get(stat_key)
+        if file_hash is None:
+            file_hash = hash_file(path)
+            self._file_hashes[stat_key] = file_hash
+        return file_hash
+
+    def get_key(self, kpi: 'GridKpi', recording: Recording) -> str:
+        key = {
+            'kpi': f"{type(kpi).__module__}.{type(kpi).__qualname__}",
+            'version': kpi.version,
+            'parameters': kpi.get_parameters(),
+            # KPIs without declared input files must not share their values across recordings
+            'recording': str(recording.directory.resolve()),
+            'inputs': {str(path): self._hash_file(path) for path in kpi.get_input_files(recording)},
+        }
+        return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, kpi: 'GridKpi', recording: Recording) -> Optional[list[float]]:
+        entry_path = self._entry_path(self.get_key(kpi, recording))
+        try:
+            with open(entry_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            # keep track of the last access for LRU eviction
+            os.utime(entry_path)
+        except FileNotFoundError:
+            self.misses += 1
+            profiling.count('result_cache_misses')
+            logger.info(f"KPI result cache miss for '{kpi.name}' on '{recording.directory}'")
+            return None
+        self.hits += 1
+        profiling.count('result_cache_hits')
+        logger.info(f"KPI result cache hit for '{kpi.name}' on '{recording.directory}'")
+        return entry['values']
+
+    def put(self, kpi: 'GridKpi', recording: Recording, values: list[float]):
+        entry_path = self._entry_path(self.get_key(kpi, recording))
+        # numpy scalars are stored as Python numbers of the same kind, so that integer values stay integers
+        entry = {'episode': str(recording.directory), 'kpi': kpi.name,
+                 'values': [value.item() if isinstance(value, np.generic) else value for value in values]}
+        tmp_entry_path = entry_path.with_name(f"{entry_path.name}.{os.getpid()}.tmp")
+        with open(tmp_entry_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_entry_path, entry_path)
+        self.evict()
+
+    def _entries(self) -> list[tuple[Path, os.stat_result]]:
+        entries = []
+        for entry_path in self.directory.glob('*.json'):
+            try:
+                entries.append((entry_path, entry_path.stat()))
+            except FileNotFoundError:
+                # removed by another process
+                pass
+        return entries
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache size is below max_size.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[1].st_mtime_ns)
+        size = sum(stat.st_size for _, stat in entries)
+        for entry_path, stat in entries:
+            if size <= self.max_size:
+                break
+            entry_path.unlink(missing_ok=True)
+            size -= stat.st_size
+
+    def invalidate(self, episode: Optional[str] = None, kpi_name: Optional[str] = None) -> int:
+        """
+        Remove entries of an episode and/or a KPI name, all entries if none is given. Returns the number of
+        removed entries.
+        """
+        removed_count = 0
+        for entry_path, _ in self._entries():
+            try:
+                with open(entry_path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except FileNotFoundError:
+                continue
+            if (episode is None or entry['episode'] == episode) and (kpi_name is None or entry['kpi'] == kpi_name):
+                entry_path.unlink(missing_ok=True)
+                removed_count += 1
+        logger.info(f"{removed_count} KPI result cache entries invalidated")
+        return removed_count
@@ -0,0 +1,72 @@
+# Copyright (c) 2025, RTE (http://www.rte-france.com)
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+
+import numpy as np
+
+# currents and rho of the N-1 analysis are stored in single precision to halve the memory of the large
+# (time, contingency, branch) arrays
+FLOW_DTYPE = np.float32
+
+
+def sum_by_step(values: np.ndarray) -> np.ndarray:
+    # each step is summed on its own so that sums do not depend on the other steps of the array
+    return np.array([step_values.sum(dtype=np.float64) for step_values in values], dtype=np.float64)
+
+
+def compute_rho(flows: np.ndarray, thermal_limits: np.ndarray) -> np.ndarray:
+    """
+    (time, contingency, monitored branch) rho, as the max of the rho of both sides of each branch, from the
+    (time, contingency, monitored branch, side) currents and the (time, monitored branch) thermal limits.
+    """
+    monitored_thermal_limits = thermal_limits[:, np.newaxis, :]
+    rho1 = flows[..., 0] / monitored_thermal_limits
+    rho2 = flows[..., 1] / monitored_thermal_limits
+    return np.where(rho2 > rho1, rho2, rho1)
+
+
+class RhoAggregates:
+    """
+    N-1 rho of consecutive steps reduced step by step, instead of keeping the currents of every (step,
+    contingency, branch): max, sum and overload count of the rho of each step, and the entries whose rho
+    reaches a threshold (limit violations for a threshold of 1), as (step, contingency index, branch index, rho)
+    arrays. Memory grows with the number of entries above the threshold only.
+    """
+    def __init__(self, step_max: np.ndarray, step_sum: np.ndarray, step_overloads: np.ndarray,
+                 violation_steps: np.ndarray, violation_contingencies: np.ndarray, violation_branches: np.ndarray,
+                 violation_rho: np.ndarray):
+        self.step_max = step_max
+        self.step_sum = step_sum
+        self.step_overloads = step_overloads
+        self.violation_steps = violation_steps
+        self.violation_contingencies = violation_contingencies
+        self.violation_branches = violation_branches
+        self.violation_rho = violation_rho
+
+    @staticmethod
+    def reduce(flows: np.ndarray, thermal_limits: np.ndarray, threshold: float, first_step: int) -> 'RhoAggregates':
+        """
+        Reduce the currents of consecutive steps, the first one being first_step, with their thermal limits.
+        """
+        rho = compute_rho(flows, thermal_limits)
+        steps, contingencies, branches = np.nonzero(rho >= threshold)
+        return RhoAggregates(np.max(rho, axis=(1, 2), initial=-np.inf), sum_by_step(rho),
+                             np.sum(rho > 1, axis=(1, 2)),
+                             steps + first_step, contingencies, branches, rho[steps, contingencies, branches])
+
+    @staticmethod
+    def concatenate(aggregates: list['RhoAggregates']) -> 'RhoAggregates':
+        """
+        Concatenate the aggregates of consecutive runs of steps, in time order.
+        """
+        return RhoAggregates(*[np.concatenate([getattr(part, name) for part in aggregates])
+                               for name in ['step_max', 'step_sum', 'step_overloads', 'violation_steps',
+                                            'violation_contingencies', 'violation_branches', 'violation_rho']])
+
+    @staticmethod
+    def empty() -> 'RhoAggregates':
+        return RhoAggregates(np.zeros(0, dtype=FLOW_DTYPE), np.zeros(0), np.zeros(0, dtype=np.int64),
+                             np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                             np.zeros(0, dtype=FLOW_DTYPE))
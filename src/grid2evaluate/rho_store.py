@@ -0,0 +1,230 @@
+# Copyright (c) 2025, RTE (http://www.rte-france.com)
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+
+import argparse
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+# steps of a chunk reduced at once by the queries, to bound the memory read from the memory-mapped arrays
+QUERY_BLOCK_SIZE = 256
+
+
+class RhoStore:
+    """
+    N and N-1 rho of the network utilization evaluation of a recording, persisted in a sidecar directory of
+    the recording (.rho) so that they can be drilled down without running the security analysis again.
+    Each evaluation, or each checkpoint resume, writes a chunk of consecutive steps as .npy files that are
+    memory-mapped when read:
+    - time.npy: (step) time of the steps,
+    - rho_n.npy: (step, branch) N state rho, NaN for monitored branches without recorded rho,
+    - rho_n1.npy: (step, contingency, branch) N-1 rho,
+    - n_diverged.npy: (step) whether the N state load flow diverged,
+    - n1_divergences.npy: (step) number of contingencies whose load flow diverged.
+    Contingency and monitored branch ids, the labels of the other axes, are in axes.json.
+    """
+    DIRECTORY_NAME = '.rho'
+    AXES_FILE_NAME = 'axes.json'
+    CHUNK_PREFIX = 'chunk-'
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    @staticmethod
+    def of_recording(recording_directory: Path) -> 'RhoStore':
+        return RhoStore(recording_directory / RhoStore.DIRECTORY_NAME)
+
+    def _read_axes(self) -> Optional[dict]:
+        axes_path = self.directory / self.AXES_FILE_NAME
+        if not axes_path.exists():
+            return None
+        with open(axes_path) as f:
+            return json.load(f)
+
+    @property
+    def contingency_ids(self) -> list[str]:
+        return self._read_axes()['contingency_ids']
+
+    @property
+    def branch_ids(self) -> list[str]:
+        return self._read_axes()['branch_ids']
+
+    def _chunk_directories(self) -> list[tuple[int, Path]]:
+        if not self.directory.exists():
+            return []
+        chunks = [(int(path.name[len(self.CHUNK_PREFIX):]), path) for path in self.directory.iterdir()
+                  if path.is_dir() and path.name.startswith(self.CHUNK_PREFIX)]
+        return sorted(chunks)
+
+    def write(self, start: int, contingency_ids: list[str], branch_ids: list[str], time: np.ndarray,
+              rho_n: np.ndarray, rho_n1: np.ndarray, n_diverged: np.ndarray, n1_divergences: np.ndarray):
+        """
+        Write the chunk of the steps of the recording from start. The chunks of the steps from start are
+        replaced, and the whole store if its earlier chunks do not end at start or have other axes.
+        """
+        axes = {'contingency_ids': list(contingency_ids), 'branch_ids': list(branch_ids)}
+        chunks = self._chunk_directories()
+        end = 0
+        for chunk_start, chunk_directory in chunks:
+            if chunk_start < start:
+                end = chunk_start + len(np.load(chunk_directory / 'time.npy', mmap_mode='r'))
+        if start > 0 and (end != start or self._read_axes() != axes):
+            logger.warning(f"Rho store '{self.directory}' does not cover the steps before {start}, it is cleared")
+            start_kept = 0
+        else:
+            start_kept = start
+        if start_kept == 0 and self.directory.exists():
+            shutil.rmtree(self.directory)
+        else:
+            for chunk_start, chunk_directory in chunks:
+                if chunk_start >= start:
+                    shutil.rmtree(chunk_directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / self.AXES_FILE_NAME, 'w') as f:
+            json.dump(axes, f)
+
+        # written to a temporary directory first so that an interrupted write never leaves a partial chunk
+        chunk_directory = self.directory / f"{self.CHUNK_PREFIX}{start}"
+        tmp_directory = self.directory / f"{chunk_directory.name}.{os.getpid()}.tmp"
+        tmp_directory.mkdir()
+        np.save(tmp_directory / 'time.npy', time)
+        np.save(tmp_directory / 'rho_n.npy', rho_n)
+        np.save(tmp_directory / 'rho_n1.npy', rho_n1)
+        np.save(tmp_directory / 'n_diverged.npy', n_diverged)
+        np.save(tmp_directory / 'n1_divergences.npy', n1_divergences)
+        os.replace(tmp_directory, chunk_directory)
+        logger.info(f"N-1 rho of {len(time)} steps from step {start} written to '{chunk_directory}'")
+
+    def iter_chunks(self) -> Iterator[dict[str, np.ndarray]]:
+        """
+        Memory-mapped arrays of each chunk, by file name without extension, in time order.
+        """
+        for _, chunk_directory in self._chunk_directories():
+            yield {name: np.load(chunk_directory / f'{name}.npy', mmap_mode='r')
+                   for name in ['time', 'rho_n', 'rho_n1', 'n_diverged', 'n1_divergences']}
+
+    def _iter_blocks(self) -> Iterator[dict[str, np.ndarray]]:
+        for chunk in self.iter_chunks():
+            for block_start in range(0, len(chunk['time']), QUERY_BLOCK_SIZE):
+                yield {name: array[block_start:block_start + QUERY_BLOCK_SIZE] for name, array in chunk.items()}
+
+    def get_step(self, time: int) -> Optional[dict[str, np.ndarray]]:
+        """
+        Arrays of the step of the given time, None if it is not stored.
+        """
+        for chunk in self.iter_chunks():
+            step_indexes = np.flatnonzero(chunk['time'] == time)
+            if len(step_indexes) > 0:
+                return {name: np.asarray(array[step_indexes[0]]) for name, array in chunk.items()}
+        return None
+
+    def worst_contingencies(self, time: int, n: int = 5) -> pa.Table:
+        """
+        The n contingencies with the highest N-1 rho at the step of the given time, with the branch of their
+        max rho and the N state rho of that branch.
+        """
+        step = self.get_step(time)
+        if step is None:
+            raise ValueError(f"Time {time} is not in the rho store '{self.directory}'")
+        branch_indexes = np.argmax(step['rho_n1'], axis=1)
+        contingency_rho = np.take_along_axis(step['rho_n1'], branch_indexes[:, np.newaxis], axis=1)[:, 0]
+        contingency_indexes = np.argsort(-contingency_rho, kind='stable')[:n]
+        return pa.table({
+            'contingency_id': pa.array(np.array(self.contingency_ids, dtype=object)[contingency_indexes], pa.string()),
+            'branch_id': pa.array(np.array(self.branch_ids, dtype=object)[branch_indexes[contingency_indexes]], pa.string()),
+            'rho': contingency_rho[contingency_indexes],
+            'rho_n': step['rho_n'][branch_indexes[contingency_indexes]],
+        })
+
+    def worst_by_step(self) -> pa.Table:
+        """
+        For each step, the (contingency, branch) pair of its highest N-1 rho, with the divergences of the step.
+        """
+        contingency_ids = np.array(self.contingency_ids, dtype=object)
+        branch_ids = np.array(self.branch_ids, dtype=object)
+        n_pairs = len(contingency_ids) * len(branch_ids)
+        columns = {'time': [], 'pair': [], 'rho': [], 'n_diverged': [], 'n1_divergences': []}
+        for block in self._iter_blocks():
+            step_rho_n1 = np.asarray(block['rho_n1']).reshape(len(block['time']), n_pairs)
+            step_pairs = np.argmax(step_rho_n1, axis=1) if n_pairs > 0 else np.full(len(block['time']), -1)
+            columns['time'].append(np.asarray(block['time']))
+            columns['pair'].append(step_pairs)
+            columns['rho'].append(step_rho_n1[np.arange(len(step_pairs)), step_pairs] if n_pairs > 0
+                                  else np.full(len(step_pairs), np.nan, dtype=step_rho_n1.dtype))
+            columns['n_diverged'].append(np.asarray(block['n_diverged']))
+            columns['n1_divergences'].append(np.asarray(block['n1_divergences']))
+        columns = {name: np.concatenate(arrays) if len(arrays) > 0 else np.zeros(0, dtype=np.int64)
+                   for name, arrays in columns.items()}
+        pairs = columns.pop('pair')
+        contingency_indexes, branch_indexes = np.divmod(pairs, max(1, len(branch_ids)))
+        return pa.table({
+            'time': columns['time'],
+            'contingency_id': pa.array(contingency_ids[contingency_indexes] if n_pairs > 0 else [None] * len(pairs),
+                                       pa.string()),
+            'branch_id': pa.array(branch_ids[branch_indexes] if n_pairs > 0 else [None] * len(pairs), pa.string()),
+            'rho': columns['rho'],
+            'n_diverged': columns['n_diverged'].astype(bool),
+            'n1_divergences': columns['n1_divergences'],
+        })
+
+    def worst_by_branch(self, branch_id: str, n: int = 5) -> pa.Table:
+        """
+        The n contingencies causing the highest N-1 rho of a branch over all steps, with the time of their max.
+        """
+        branch_ids = self.branch_ids
+        if branch_id not in branch_ids:
+            raise ValueError(f"Branch '{branch_id}' is not monitored in the rho store '{self.directory}'")
+        branch_index = branch_ids.index(branch_id)
+        contingency_rho = np.full(len(self.contingency_ids), -np.inf)
+        contingency_times = np.zeros(len(self.contingency_ids), dtype=np.int64)
+        for block in self._iter_blocks():
+            branch_rho = np.asarray(block['rho_n1'][:, :, branch_index])
+            if len(branch_rho) == 0:
+                continue
+            block_steps = np.argmax(branch_rho, axis=0)
+            block_rho = branch_rho[block_steps, np.arange(branch_rho.shape[1])]
+            # the first step of the max is kept on ties
+            higher = block_rho > contingency_rho
+            contingency_rho[higher] = block_rho[higher]
+            contingency_times[higher] = np.asarray(block['time'])[block_steps[higher]]
+        contingency_indexes = np.argsort(-contingency_rho, kind='stable')[:n]
+        return pa.table({
+            'contingency_id': pa.array(np.array(self.contingency_ids, dtype=object)[contingency_indexes], pa.string()),
+            'time': contingency_times[contingency_indexes],
+            'rho': contingency_rho[contingency_indexes],
+        })
+
+
+def main(args: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description='Query the N-1 rho persisted by the network utilization KPI')
+    parser.add_argument('recording', type=Path, help='recording directory')
+    parser.add_argument('--time', type=int, help='time of the step whose worst contingencies are listed')
+    parser.add_argument('--branch', help='branch whose worst contingencies over all steps are listed')
+    parser.add_argument('-n', type=int, default=5, help='number of contingencies listed')
+    parsed_args = parser.parse_args(args)
+
+    store = RhoStore.of_recording(parsed_args.recording)
+    if not (store.directory / RhoStore.AXES_FILE_NAME).exists():
+        parser.error(f"No rho store in '{parsed_args.recording}', evaluate it with NetworkUtilizationKpi(persist_rho=True)")
+    if parsed_args.time is not None:
+        table = store.worst_contingencies(parsed_args.time, parsed_args.n)
+    elif parsed_args.branch is not None:
+        table = store.worst_by_branch(parsed_args.branch, parsed_args.n)
+    else:
+        table = store.worst_by_step()
+    print(table.to_pandas().to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# Copyright (c) 2025, RTE (http://www.rte-france.com)
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+
+import math
+from statistics import NormalDist
+from typing import Optional
+
+import numpy as np
+
+SAMPLING_METHODS = ['every_k', 'random', 'stratified']
+
+
+class StepSample:
+    """
+    Sample of the steps of an episode, to estimate the mean of a per step value over all steps: every k-th
+    step, uniform random steps or random steps stratified by load level. Sampled step indexes are sorted, each
+    sampled step belongs to a stratum (a single one except for stratified sampling).
+    """
+    def __init__(self, indexes: np.ndarray, strata: np.ndarray, stratum_sizes: np.ndarray):
+        self.indexes = indexes
+        self.strata = strata
+        self.stratum_sizes = stratum_sizes
+
+    @property
+    def n_steps(self) -> int:
+        return int(self.stratum_sizes.sum())
+
+    @staticmethod
+    def create(method: str, n_steps: int, rate: float, seed: int = 0, load_levels: Optional[np.ndarray] = None,
+               n_strata: int = 5) -> 'StepSample':
+        """
+        Sample about rate * n_steps steps. load_levels, the total load of each step, is needed by stratified
+        sampling, which splits steps in n_strata load quantiles and samples each of them at the given rate
+        (at least 2 steps by stratum so that its variance can be estimated).
+        """
+        if method not in SAMPLING_METHODS:
+            raise ValueError(f"Unknown sampling method '{method}', expected one of {SAMPLING_METHODS}")
+        if not 0 < rate <= 1:
+            raise ValueError(f"Sampling rate must be in ]0, 1], got {rate}")
+        rng = np.random.default_rng(seed)
+        if method == 'every_k':
+            indexes = np.arange(0, n_steps, max(1, round(1 / rate)))
+            return StepSample(indexes, np.zeros(len(indexes), dtype=int), np.array([n_steps]))
+        if method == 'random':
+            indexes = np.sort(rng.choice(n_steps, min(n_steps, max(1, math.ceil(rate * n_steps))), replace=False))
+            return StepSample(indexes, np.zeros(len(indexes), dtype=int), np.array([n_steps]))
+
+        edges = np.quantile(load_levels, np.linspace(0, 1, n_strata + 1)[1:-1])
+        step_strata = np.searchsorted(edges, load_levels, side='right')
+        stratum_sizes = np.bincount(step_strata, minlength=n_strata)
+        indexes = []
+        for stratum in range(n_strata):
+            stratum_indexes = np.flatnonzero(step_strata == stratum)
+            size = min(len(stratum_indexes), max(2, round(rate * len(stratum_indexes))))
+            indexes.append(rng.choice(stratum_indexes, size, replace=False))
+        indexes = np.sort(np.concatenate(indexes)).astype(int)
+        return StepSample(indexes, step_strata[indexes], stratum_sizes)
+
+    def estimate_mean(self, values: np.ndarray, confidence: float) -> tuple[float, float, float]:
+        """
+        Estimate the mean over all steps of a value known on the sampled steps, with the bounds of its
+        confidence interval (normal approximation, with finite population correction).
+        Returns the estimate, the lower bound and the upper bound.
+        """
+        mean = 0.0
+        variance = 0.0
+        for stratum, stratum_size in enumerate(self.stratum_sizes):
+            stratum_values = values[self.strata == stratum]
+            if len(stratum_values) == 0:
+                continue
+            weight = stratum_size / self.n_steps
+            mean += weight * stratum_values.mean()
+            if len(stratum_values) > 1:
+                variance += (weight ** 2 * (1 - len(stratum_values) / stratum_size)
+                             * stratum_values.var(ddof=1) / len(stratum_values))
+        half_width = NormalDist().inv_cdf((1 + confidence) / 2) * math.sqrt(variance)
+        return mean, mean - half_width, mean + half_width
@@ -0,0 +1,38 @@
+# Copyright (c) 2025, RTE (http://www.rte-france.com)
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class SecurityAnalysisCache:
+    """
+    LRU cache of security analysis results of a step, keyed by the fingerprint of the network state, so that
+    steps with identical (or identical once quantized) injections and topology are only solved once.
+    """
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+
+    def __len__(self):
+        return len(self._results)
+
+    def get(self, fingerprint: bytes) -> Optional[Any]:
+        result = self._results.get(fingerprint)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._results.move_to_end(fingerprint)
+        return result
+
+    def put(self, fingerprint: bytes, result: Any):
+        self._results[fingerprint] = result
+        self._results.move_to_end(fingerprint)
+        while len(self._results) > self.max_size:
+            self._results.popitem(last=False)
@@ -0,0 +1,175 @@
+# Copyright (c) 2025, RTE (http://www.rte-france.com)
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+
+import json
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pypowsybl as pp
+
+GEN_TYPES = ['thermal', 'hydro', 'solar', 'nuclear', 'wind']
+
+# time step of the recording in seconds
+TIME_STEP = 300
+
+
+def _create_network(n_sub: int, gen_subs: list[int], load_subs: list[int], storage_subs: list[int],
+                    line_or_subs: list[int], line_ex_subs: list[int]) -> tuple[pp.network.Network, list[str], list[str], list[str], list[str]]:
+    network = pp.network.create_empty()
+    sub_ids = [f"sub_{sub}" for sub in range(n_sub)]
+    voltage_level_ids = [f"vl_{sub}" for sub in range(n_sub)]
+    network.create_substations(id=sub_ids)
+    network.create_voltage_levels(id=voltage_level_ids, substation_id=sub_ids, topology_kind=['BUS_BREAKER'] * n_sub,
+                                  nominal_v=[225.0] * n_sub, low_voltage_limit=[200.0] * n_sub,
+                                  high_voltage_limit=[250.0] * n_sub)
+    network.create_buses(id=[f"bus_{sub}" for sub in range(n_sub)], voltage_level_id=voltage_level_ids)
+
+    # element names are the ones of Grid2op: <element>_<substation>_<index>, or <or sub>_<ex sub>_<index> for lines
+    line_names = [f"{or_sub}_{ex_sub}_{index}" for index, (or_sub, ex_sub) in enumerate(zip(line_or_subs, line_ex_subs))]
+    n_line = len(line_names)
+    network.create_lines(id=line_names, name=line_names,
+                         voltage_level1_id=[voltage_level_ids[sub] for sub in line_or_subs],
+                         bus1_id=[f"bus_{sub}" for sub in line_or_subs],
+                         voltage_level2_id=[voltage_level_ids[sub] for sub in line_ex_subs],
+                         bus2_id=[f"bus_{sub}" for sub in line_ex_subs],
+                         r=[1.0] * n_line, x=[10.0] * n_line, g1=[0.0] * n_line, b1=[1e-6] * n_line,
+                         g2=[0.0] * n_line, b2=[1e-6] * n_line)
+
+    gen_names = [f"gen_{sub}_{index}" for index, sub in enumerate(gen_subs)]
+    n_gen = len(gen_names)
+    network.create_generators(id=gen_names, name=gen_names, voltage_level_id=[voltage_level_ids[sub] for sub in gen_subs],
+                              bus_id=[f"bus_{sub}" for sub in gen_subs], min_p=[0.0] * n_gen, max_p=[1000.0] * n_gen,
+                              target_p=[100.0] * n_gen, target_v=[225.0] * n_gen, target_q=[0.0] * n_gen,
+                              voltage_regulator_on=[True] * n_gen)
+
+    load_names = [f"load_{sub}_{index}" for index, sub in enumerate(load_subs)]
+    n_load = len(load_names)
+    network.create_loads(id=load_names, name=load_names, voltage_level_id=[voltage_level_ids[sub] for sub in load_subs],
+                         bus_id=[f"bus_{sub}" for sub in load_subs], p0=[10.0] * n_load, q0=[1.0] * n_load)
+
+    storage_names = [f"storage_{sub}_{index}" for index, sub in enumerate(storage_subs)]
+    n_storage = len(storage_names)
+    if n_storage > 0:
+        network.create_batteries(id=storage_names, name=storage_names,
+                                 voltage_level_id=[voltage_level_ids[sub] for sub in storage_subs],
+                                 bus_id=[f"bus_{sub}" for sub in storage_subs], min_p=[-100.0] * n_storage,
+                                 max_p=[100.0] * n_storage, target_p=[0.0] * n_storage, target_q=[0.0] * n_storage)
+    return network, gen_names, load_names, storage_names, line_names
+
+
+def _create_time_series_table(time: pa.Array, names: list[str], values: np.ndarray) -> pa.Table:
+    columns = {'time': time}
+    for index, name in enumerate(names):
+        columns[name] = pa.array(values[:, index])
+    return pa.table(columns)
+
+
+def generate_recording(directory: Path, n_gen: int = 5, n_load: int = 11, n_line: int = 20, n_steps: int = 50,
+                       n_sub: int = 14, n_storage: int = 0, n_busbar_per_sub: int = 2,
+                       done_at: Optional[int] = None, seed: int = 0) -> Path:
+    """
+    Write a synthetic recording with the schema of the Grid2op EnvRecorder (element tables, time series
+    tables, actions and env.json) and its grid as an IIDM file, without needing Grid2op. Lines first form a
+    ring through all substations so that the grid is connected, the other ones join random substations.
+    Injections are random around a balanced state; some loads, storages and lines switch bus or get
+    disconnected over time and random actions are recorded. If done_at is given, the episode ends at
+    this step. The recording is reproducible for a given seed.
+    """
+    if n_line < n_sub:
+        raise ValueError(f"At least {n_sub} lines are needed to connect {n_sub} substations")
+    rng = np.random.default_rng(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    line_or_subs = list(range(n_sub))
+    line_ex_subs = [(sub + 1) % n_sub for sub in range(n_sub)]
+    for _ in range(n_line - n_sub):
+        or_sub, ex_sub = rng.choice(n_sub, 2, replace=False)
+        line_or_subs.append(int(or_sub))
+        line_ex_subs.append(int(ex_sub))
+    gen_subs = [index % n_sub for index in range(n_gen)]
+    load_subs = [(index * 3 + 1) % n_sub for index in range(n_load)]
+    storage_subs = [(index * 5 + 2) % n_sub for index in range(n_storage)]
+    network, gen_names, load_names, storage_names, line_names = _create_network(n_sub, gen_subs, load_subs, storage_subs,
+                                                                                line_or_subs, line_ex_subs)
+    network.save(str(directory / 'grid.xiidm'))
+
+    pq.write_table(pa.table({'name': gen_names, 'type': [GEN_TYPES[index % len(GEN_TYPES)] for index in range(n_gen)],
+                             'gen_to_subid': gen_subs}), directory / 'gen.parquet')
+    pq.write_table(pa.table({'name': load_names, 'load_to_subid': load_subs}), directory / 'load.parquet')
+    pq.write_table(pa.table({'name': pa.array(storage_names, pa.string()),
+                             'storage_to_subid': pa.array(storage_subs, pa.int64())}), directory / 'storage.parquet')
+    pq.write_table(pa.table({'name': line_names, 'line_or_to_subid': line_or_subs, 'line_ex_to_subid': line_ex_subs}),
+                   directory / 'line.parquet')
+
+    time = pa.array(np.arange(n_steps, dtype=np.int64) * TIME_STEP + 1_700_000_000)
+
+    def write_time_series(name: str, names: list[str], values: np.ndarray):
+        pq.write_table(_create_time_series_table(time, names, values), directory / f'{name}.parquet')
+
+    def random_buses(n_elements: int) -> np.ndarray:
+        buses = np.ones((n_steps, n_elements), dtype=np.int64)
+        if n_elements > 0:
+            for time_index in range(n_steps):
+                if rng.random() < 0.2:
+                    buses[time_index:, rng.integers(n_elements)] = rng.integers(1, n_busbar_per_sub + 1)
+        return buses
+
+    # generators share the load, the last one having no voltage target
+    load_p = 10 + 5 * rng.random((n_steps, n_load))
+    gen_p = np.tile(load_p.sum(axis=1, keepdims=True) / n_gen, (1, n_gen)) * (1 + 0.01 * rng.standard_normal((n_steps, n_gen)))
+    gen_v = np.full((n_steps, n_gen), 225.0)
+    gen_v[:, -1] = 0.0
+    write_time_series('gen_p', gen_names, gen_p)
+    write_time_series('gen_p_before_curtail', gen_names, gen_p - rng.random((n_steps, n_gen)))
+    write_time_series('gen_actual_dispatch', gen_names, rng.standard_normal((n_steps, n_gen)))
+    write_time_series('gen_target_dispatch', gen_names, rng.standard_normal((n_steps, n_gen)))
+    write_time_series('gen_v', gen_names, gen_v)
+    write_time_series('gen_bus', gen_names, np.ones((n_steps, n_gen), dtype=np.int64))
+    write_time_series('load_p', load_names, load_p)
+    write_time_series('load_q', load_names, 0.1 * load_p)
+    write_time_series('load_bus', load_names, random_buses(n_load))
+    write_time_series('storage_power', storage_names, rng.standard_normal((n_steps, n_storage)))
+    write_time_series('storage_bus', storage_names, random_buses(n_storage))
+
+    # lines out of the ring switch bus or get disconnected every 7 steps
+    line_or_bus = np.ones((n_steps, n_line), dtype=np.int64)
+    line_ex_bus = np.ones((n_steps, n_line), dtype=np.int64)
+    for time_index in range(5, n_steps, 7):
+        line_index = rng.integers(n_sub, n_line) if n_line > n_sub else rng.integers(n_line)
+        line_or_bus[time_index:, line_index] = rng.choice([-1, 1, 2])
+        if line_or_bus[time_index, line_index] == -1:
+            line_ex_bus[time_index:, line_index] = -1
+    write_time_series('line_or_bus', line_names, line_or_bus)
+    write_time_series('line_ex_bus', line_names, line_ex_bus)
+    write_time_series('line_rho', line_names, 1.2 * rng.random((n_steps, n_line)))
+    write_time_series('line_thermal_limit', line_names, np.full((n_steps, n_line), 400.0))
+
+    actions = []
+    for _ in range(n_steps):
+        action = {}
+        draw = rng.random()
+        if draw < 0.1:
+            action['set_bus'] = {'lines_or_id': [[line_names[0], 2]]}
+        elif draw < 0.2:
+            action['redispatch'] = [[gen_names[0], 1.0]]
+        elif draw < 0.3:
+            action['curtail'] = [[gen_names[-1], 0.5]]
+        elif draw < 0.35:
+            action['line_set_status'] = [[line_names[1], -1]]
+        elif draw < 0.4:
+            action['change_bus'] = {'loads_id': [load_names[0]]}
+        actions.append(json.dumps(action))
+    done = [False] * n_steps
+    if done_at is not None:
+        done[done_at] = True
+    pq.write_table(pa.table({'time': time, 'action': actions, 'done': done}), directory / 'actions.parquet')
+
+    with open(directory / 'env.json', 'w', encoding='utf-8') as f:
+        json.dump({'path': str(directory), 'n_sub': n_sub, 'n_busbar_per_sub': n_busbar_per_sub}, f)
+    return directory
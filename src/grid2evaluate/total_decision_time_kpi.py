@@ -4,15 +4,16 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 # SPDX-License-Identifier: MPL-2.0
 
-from pathlib import Path
-
 from grid2evaluate.grid_kpi import GridKpi
+from grid2evaluate.recording import Recording
 
 
 class TotalDecisionTimeKpi(GridKpi):
+    value_names = ['total_decision_time']
+
     def __init__(self):
         super().__init__("Total decision time")
 
-    def evaluate(self, directory: Path) -> list[float]:
+    def _evaluate(self, recording: Recording) -> list[float]:
         # TODO
         return [0]
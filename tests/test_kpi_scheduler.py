@@ -0,0 +1,34 @@
+# Copyright (c) 2025, RTE (http://www.rte-france.com)
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+
+from pathlib import Path
+
+from grid2evaluate.grid_kpi import GridKpi
+from grid2evaluate.kpi_scheduler import KpiScheduler
+from grid2evaluate.recording import Recording
+from grid2evaluate.result_cache import KpiResultCache
+
+
+class ConstantKpi(GridKpi):
+    def __init__(self, value: float):
+        super().__init__(f"Constant {value}")
+        self.value = value
+
+    def _evaluate(self, recording: Recording) -> list[float]:
+        return [self.value]
+
+
+def test_cache_is_looked_up_once_per_kpi(tmp_path: Path):
+    cache = KpiResultCache(tmp_path / 'cache')
+    recording = tmp_path / 'episode'
+    recording.mkdir()
+    kpis = [ConstantKpi(value) for value in [1.0, 2.0, 3.0]]
+
+    for workers in [1, 2]:
+        results = KpiScheduler(kpis, workers).evaluate(Recording(recording), cache)
+        assert [values for values, _ in results] == [[1.0], [2.0], [3.0]]
+    assert cache.misses == 3
+    assert cache.hits == 3
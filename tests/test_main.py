@@ -0,0 +1,35 @@
+# Copyright (c) 2025, RTE (http://www.rte-france.com)
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from grid2evaluate.kpi_registry import get_kpi_names
+from grid2evaluate.main import RESULTS_SCHEMA, evaluate_recording, read_results
+from grid2evaluate.synthetic_recording import generate_recording
+
+
+def test_result_rows_are_named(tmp_path: Path):
+    recording_directory = generate_recording(tmp_path / 'recording', n_storage=2, n_steps=10, done_at=9)
+    kpi_options = {'network_utilization': {'screening_threshold': 0.5, 'violation_threshold': 0.3}}
+    rows, _ = evaluate_recording(recording_directory, get_kpi_names(), kpi_options=kpi_options)
+
+    assert all(row['metric'] is not None for row in rows)
+    metrics = {(row['kpi'], row['metric']): row['metric_index'] for row in rows}
+    assert metrics[('Network utilization', 'n1_divergences')] == 7
+    assert metrics[('Network utilization', 'violations')] == 10
+    assert metrics[('Operation score', 'lost_energy')] == 6
+
+
+def test_results_without_metric_names_are_read(tmp_path: Path):
+    output = tmp_path / 'results.parquet'
+    pq.write_table(pa.table({'episode': ['episode'], 'kpi': ['Carbon Intensity'], 'metric_index': [0],
+                             'value': [1.0], 'wall_time': [0.1]}), output)
+    results = read_results(output)
+    assert results.schema == RESULTS_SCHEMA
+    assert results['metric'].to_pylist() == [None]
@@ -0,0 +1,106 @@
+# Copyright (c) 2025, RTE (http://www.rte-france.com)
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+
+import shutil
+from pathlib import Path
+
+import pyarrow.parquet as pq
+import pytest
+
+from grid2evaluate.network_utilization_kpi import NetworkUtilizationKpi
+from grid2evaluate.result_cache import KpiResultCache
+from grid2evaluate.synthetic_recording import generate_recording
+
+
+@pytest.fixture(scope='module')
+def recording_directory(tmp_path_factory) -> Path:
+    return generate_recording(tmp_path_factory.mktemp('recording'), n_storage=2, n_steps=40, done_at=39)
+
+
+def test_continuation_values_do_not_depend_on_block_size(recording_directory: Path):
+    values = NetworkUtilizationKpi(continuation=True).evaluate(recording_directory)
+    assert NetworkUtilizationKpi(continuation=True, block_size=8).evaluate(recording_directory) == values
+
+
+def test_continuation_parameters_keep_chunks():
+    assert 'block_size' not in NetworkUtilizationKpi(continuation=True, block_size=8).get_parameters()
+    assert NetworkUtilizationKpi(continuation=True, chunk_size=10).get_parameters()['chunk_size'] == 10
+    assert 'chunk_size' not in NetworkUtilizationKpi(chunk_size=10).get_parameters()
+
+
+def test_sampled_values_are_flagged(recording_directory: Path):
+    values = NetworkUtilizationKpi().evaluate(recording_directory)
+
+    sampled_values = NetworkUtilizationKpi(sampling='every_k', sampling_rate=0.25).evaluate(recording_directory)
+    assert len(sampled_values) == len(values) + 6
+    assert sampled_values[len(values)] == 1
+    # N-1 rho max is a lower bound
+    assert sampled_values[1] <= values[1]
+
+    all_sampled_values = NetworkUtilizationKpi(sampling='every_k', sampling_rate=1.0).evaluate(recording_directory)
+    assert all_sampled_values[len(values)] == 0
+    assert all_sampled_values[:len(values)] == pytest.approx(values)
+
+
+def test_violations_are_persisted_next_to_the_recording(recording_directory: Path, tmp_path: Path):
+    cache = KpiResultCache(tmp_path / 'cache')
+    kpi = NetworkUtilizationKpi(violation_threshold=0.3)
+    values = kpi.evaluate(recording_directory, cache)
+    violations = kpi.read_violations(recording_directory)
+    assert violations.column_names == ['time', 'contingency_id', 'branch_id', 'rho']
+    assert len(violations) == values[-1] > 0
+    assert min(violations['rho'].to_pylist()) >= 0.3
+
+    # still available after a cache hit, not with other parameters
+    assert NetworkUtilizationKpi(violation_threshold=0.3).evaluate(recording_directory, cache) == values
+    assert cache.hits == 1
+    assert NetworkUtilizationKpi(violation_threshold=0.3).read_violations(recording_directory).equals(violations)
+    assert NetworkUtilizationKpi(violation_threshold=0.5).read_violations(recording_directory) is None
+
+
+def _evaluate_with_checkpoint(recording_directory: Path, first_half: Path, kpi_options: dict) -> list[list[float]]:
+    """
+    Values of a checkpointed evaluation of the first half of the recording, of its resume on the whole
+    recording and of a resume without new steps.
+    """
+    first_half.mkdir()
+    n_steps = pq.read_metadata(recording_directory / 'gen_p.parquet').num_rows
+    for path in recording_directory.iterdir():
+        if path.suffix == '.parquet' and path.stem not in ('gen', 'load', 'line', 'storage'):
+            pq.write_table(pq.read_table(path).slice(0, n_steps // 2), first_half / path.name)
+        elif path.is_file():
+            shutil.copy(path, first_half / path.name)
+    values = [NetworkUtilizationKpi(checkpoint=True, **kpi_options).evaluate(first_half)]
+    # the recording grows to its whole length
+    for path in recording_directory.glob('*.parquet'):
+        shutil.copy(path, first_half / path.name)
+    values.append(NetworkUtilizationKpi(checkpoint=True, **kpi_options).evaluate(first_half))
+    values.append(NetworkUtilizationKpi(checkpoint=True, **kpi_options).evaluate(first_half))
+    return values
+
+
+def test_resumed_screening_counts_cover_all_steps(recording_directory: Path, tmp_path: Path):
+    kpi_options = {'screening_threshold': 0.5}
+    values = NetworkUtilizationKpi(**kpi_options).evaluate(recording_directory)
+
+    first_half_values, resumed_values, unchanged_values = _evaluate_with_checkpoint(recording_directory,
+                                                                                     tmp_path / 'first_half',
+                                                                                     kpi_options)
+    assert sum(first_half_values[8:10]) < sum(values[8:10])
+    assert resumed_values == values
+    assert unchanged_values == values
+
+
+def test_resumed_continuation_counts_cover_all_steps(recording_directory: Path, tmp_path: Path):
+    kpi_options = {'screening_threshold': 0.5, 'continuation': True}
+    values = NetworkUtilizationKpi(**kpi_options).evaluate(recording_directory)
+
+    first_half_values, resumed_values, unchanged_values = _evaluate_with_checkpoint(recording_directory,
+                                                                                     tmp_path / 'first_half',
+                                                                                     kpi_options)
+    assert len(values) == 10
+    assert resumed_values == values
+    assert unchanged_values == values
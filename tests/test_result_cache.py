@@ -0,0 +1,52 @@
+# Copyright (c) 2025, RTE (http://www.rte-france.com)
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+# SPDX-License-Identifier: MPL-2.0
+
+from pathlib import Path
+
+from grid2evaluate.grid_kpi import GridKpi
+from grid2evaluate.recording import Recording
+from grid2evaluate.result_cache import KpiResultCache
+
+
+class RecordingNameKpi(GridKpi):
+    """
+    KPI without input files, whose values depend on the recording.
+    """
+    def __init__(self):
+        super().__init__("Recording name")
+        self.evaluations = 0
+
+    def get_parameters(self) -> dict:
+        return {}
+
+    def _evaluate(self, recording: Recording) -> list[float]:
+        self.evaluations += 1
+        return [len(recording.directory.name), 0.5]
+
+
+def test_kpi_without_input_files_is_cached_by_recording(tmp_path: Path):
+    cache = KpiResultCache(tmp_path / 'cache')
+    first_recording = tmp_path / 'episode'
+    second_recording = tmp_path / 'longer_episode'
+    first_recording.mkdir()
+    second_recording.mkdir()
+    kpi = RecordingNameKpi()
+
+    assert kpi.evaluate(first_recording, cache) == [7, 0.5]
+    assert kpi.evaluate(second_recording, cache) == [14, 0.5]
+    assert kpi.evaluations == 2
+
+    # cached values keep their types
+    first_values = kpi.evaluate(first_recording, cache)
+    assert first_values == [7, 0.5]
+    assert isinstance(first_values[0], int)
+    assert kpi.evaluate(second_recording, cache) == [14, 0.5]
+    assert kpi.evaluations == 2
+
+    assert cache.invalidate(str(first_recording), kpi.name) == 1
+    assert kpi.evaluate(first_recording, cache) == [7, 0.5]
+    assert kpi.evaluate(second_recording, cache) == [14, 0.5]
+    assert kpi.evaluations == 3